@@ -1,12 +1,11 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from finance_manager import FinanceManager
-from datetime import timedelta, datetime
+from resources import get_finance_manager
 
 st.set_page_config(page_title="FloosAfandy", layout="wide", initial_sidebar_state="expanded")
 
-fm = FinanceManager()
+fm = get_finance_manager()
 
 if 'theme' not in st.session_state:
     st.session_state.theme = "فاتح"
@@ -50,10 +49,13 @@ with menu[4]:
     st.button("📈 لوحة التحكم", type="primary", disabled=True)
 
 # عرض التنبيهات
-alerts = fm.check_alerts()
+alerts = fm.get_alerts(unread_only=True)
 if alerts:
     for alert in alerts:
-        st.warning(alert)
+        st.warning(f"{alert[3]} ({alert[4]})")
+    if st.button("✔️ تحديد الكل كمقروء"):
+        fm.mark_alerts_read()
+        st.rerun()
 
 # إدارة الفئات
 st.sidebar.header("📂 إدارة الفئات")
@@ -94,31 +96,13 @@ selected_account = st.sidebar.selectbox("اختر حسابًا", options=options
                                         format_func=lambda x: "جميع الحسابات" if x == "جميع الحسابات" else account_options[x], 
                                         key="selected_account", index=default_index)
 
-if time_range == "آخر 7 أيام":
-    start_date = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
-elif time_range == "آخر 30 يومًا":
-    start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
-elif time_range == "آخر 90 يومًا":
-    start_date = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d %H:%M:%S")
-else:
-    start_date = None
-
-transactions = fm.filter_transactions(
-    account_id=selected_account if selected_account != "جميع الحسابات" else None,
-    start_date=start_date
-)
-df = pd.DataFrame(transactions, columns=["id", "date", "type", "amount", "account_id", "description", "payment_method", "category"]) if transactions else pd.DataFrame()
-
-if not df.empty:
-    df["amount"] = pd.to_numeric(df["amount"], errors='coerce')
-    df = df.dropna(subset=["amount"])
+days = {"آخر 7 أيام": 7, "آخر 30 يومًا": 30, "آخر 90 يومًا": 90}.get(time_range)
+total_in, total_out = fm.get_totals(account_id=selected_account if selected_account != "جميع الحسابات" else None, days=days)
 
 total_balance = sum(acc[2] for acc in accounts)
 col1, col2, col3 = st.columns(3)
 col1.metric("💰 إجمالي الرصيد", f"{total_balance:,.2f}", delta_color="normal")
-if not df.empty:
-    total_in = df[df["type"] == "IN"]["amount"].sum()
-    total_out = df[df["type"] == "OUT"]["amount"].sum()
+if total_in or total_out:
     col2.metric("📥 إجمالي الوارد", f"{total_in:,.2f}", delta=f"{total_in - total_out:,.2f}")
     col3.metric("📤 إجمالي الصادر", f"{total_out:,.2f}", delta=f"{total_out - total_in:,.2f}")
 
@@ -131,12 +115,8 @@ if accounts:
 
 # ملخص اليوم
 st.subheader("📅 ملخص اليوم")
-today = datetime.now().strftime("%Y-%m-%d")
-today_trans = fm.filter_transactions(start_date=today)
-if today_trans:
-    today_df = pd.DataFrame(today_trans, columns=["id", "date", "type", "amount", "account_id", "description", "payment_method", "category"])
-    today_in = today_df[today_df["type"] == "IN"]["amount"].sum()
-    today_out = today_df[today_df["type"] == "OUT"]["amount"].sum()
+today_in, today_out = fm.get_totals(days=0)
+if today_in or today_out:
     st.write(f"وارد اليوم: {today_in:,.2f} | صادر اليوم: {today_out:,.2f}")
 else:
     st.write("لا توجد معاملات اليوم")
@@ -0,0 +1,174 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+AUDIT_EVENTS = (
+    "account_added", "account_edited", "account_deleted",
+    "category_added", "category_deleted",
+    "transaction_added", "transactions_batch_added", "transaction_edited", "transaction_deleted",
+    "budget_added", "budget_edited", "budget_deleted",
+    "balance_reconciled", "statement_imported",
+    "legacy",
+)
+AUDIT_RETENTION_DAYS = 180
+AUDIT_ARCHIVE_DIR = "audit_archive"
+# مدة حجز الضغط لعملية واحدة، وبعدها يستطيع غيرها الضغط إذا توقفت في المنتصف
+AUDIT_COMPACT_LEASE_SECONDS = 3600
+
+class AuditLog:
+    # الأحداث تُوضع في طابور وتُكتب دفعات من خيط خلفي، فلا تدفع عمليات الكتابة ثمن التسجيل
+    # الأحداث الأقدم من retention_days تُنقل لملفات jsonl.gz في archive_dir وتُحذف من قاعدة البيانات
+    def __init__(self, db, batch_size=200, flush_interval=1.0, retention_days=AUDIT_RETENTION_DAYS,
+                 archive_dir=AUDIT_ARCHIVE_DIR, compact_interval=86400):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        self.compact_interval = compact_interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, event_type, entity_type=None, entity_id=None, payload=None):
+        if event_type not in AUDIT_EVENTS:
+            raise ValueError(f"نوع حدث غير معروف: {event_type}")
+        self._queue.put((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), event_type, entity_type, entity_id,
+                         json.dumps(payload or {}, ensure_ascii=False, default=str)))
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        atexit.unregister(self.close)
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        next_compact = time.monotonic()
+        while True:
+            if self.retention_days is not None and time.monotonic() >= next_compact:
+                next_compact = time.monotonic() + self.compact_interval
+                try:
+                    # كل عملية (التطبيق وعمال التقارير وسطر الأوامر) تبدأ بسجل، فالموعد محفوظ في قاعدة البيانات لا في العملية
+                    row = self.db.reader().execute("SELECT value FROM metadata WHERE key = 'audit_compacted_at'").fetchone()
+                    due = (datetime.now() - timedelta(seconds=self.compact_interval)).strftime("%Y-%m-%d %H:%M:%S")
+                    if not row or row[0] <= due:
+                        self.compact()
+                except Exception:
+                    traceback.print_exc()
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            events = [event for event in batch if event is not None]
+            try:
+                if events:
+                    # بدون db.write() حتى لا تُبطل كتابة السجل نتائج القراءة المخزنة مؤقتًا
+                    with self.db.write_lock, self.db.writer:
+                        self.db.writer.executemany('INSERT INTO audit_log (timestamp, event_type, entity_type, entity_id, payload) VALUES (?, ?, ?, ?, ?)',
+                                                   events)
+            except Exception:
+                # خطأ في دفعة واحدة لا يوقف خيط الكتابة
+                traceback.print_exc()
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(events) < len(batch):
+                return
+
+    def query(self, entity_type=None, entity_id=None, start=None, end=None, event_type=None, limit=100):
+        conditions, params = [], []
+        if entity_type:
+            conditions.append("entity_type = ?")
+            params.append(entity_type)
+        if entity_id is not None:
+            conditions.append("entity_id = ?")
+            params.append(entity_id)
+        if event_type:
+            conditions.append("event_type = ?")
+            params.append(event_type)
+        if start:
+            conditions.append("timestamp >= ?")
+            params.append(str(start))
+        if end:
+            conditions.append("timestamp <= ?")
+            params.append(f"{end} 23:59:59" if len(str(end)) == 10 else str(end))
+        query = 'SELECT id, timestamp, event_type, entity_type, entity_id, payload FROM audit_log'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        rows = self.db.reader().execute(query + ' ORDER BY timestamp DESC, id DESC LIMIT ?', params + [limit]).fetchall()
+        return [(row[0], row[1], row[2], row[3], row[4], json.loads(row[5])) for row in rows]
+
+    def _lease(self, claim):
+        # حجز الضغط في جدول metadata داخل BEGIN IMMEDIATE: عملية واحدة فقط تضغط في نفس الوقت
+        now = datetime.now()
+        with self.db.write_lock:
+            writer = self.db.writer
+            writer.execute("BEGIN IMMEDIATE")
+            try:
+                if claim:
+                    row = writer.execute("SELECT value FROM metadata WHERE key = 'audit_compact_lease'").fetchone()
+                    if row and row[0] > now.strftime("%Y-%m-%d %H:%M:%S"):
+                        writer.commit()
+                        return False
+                    writer.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('audit_compact_lease', ?)",
+                                   ((now + timedelta(seconds=AUDIT_COMPACT_LEASE_SECONDS)).strftime("%Y-%m-%d %H:%M:%S"),))
+                else:
+                    writer.execute("DELETE FROM metadata WHERE key = 'audit_compact_lease'")
+                    writer.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('audit_compacted_at', ?)",
+                                   (now.strftime("%Y-%m-%d %H:%M:%S"),))
+                writer.commit()
+                return True
+            except BaseException:
+                writer.rollback()
+                raise
+
+    def compact(self, retention_days=None, chunk_size=5000):
+        # يعيد مسار الأرشيف، أو None إذا لم توجد أحداث قديمة أو كانت عملية أخرى تضغط الآن
+        if not self._lease(claim=True):
+            return None
+        # عند الخطأ يبقى الحجز حتى تنتهي مدته، فتعيد عملية أخرى المحاولة لاحقًا
+        path = self._compact(retention_days, chunk_size)
+        self._lease(claim=False)
+        return path
+
+    def _compact(self, retention_days, chunk_size):
+        retention_days = self.retention_days if retention_days is None else retention_days
+        cutoff = (datetime.now() - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+        reader = self.db.reader()
+        first = reader.execute('SELECT MIN(id), MIN(timestamp) FROM audit_log WHERE timestamp < ?', (cutoff,)).fetchone()
+        if first[0] is None:
+            return None
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"audit-{first[1][:10]}-{cutoff[:10]}-{first[0]}.jsonl.gz")
+        last_id = 0
+        # الملف يُكتب كاملًا قبل الحذف، فلا تضيع أحداث إذا توقف البرنامج في المنتصف، والملف المؤقت باسم خاص بالعملية
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as archive:
+            while True:
+                rows = reader.execute('SELECT id, timestamp, event_type, entity_type, entity_id, payload FROM audit_log '
+                                      'WHERE timestamp < ? AND id > ? ORDER BY id LIMIT ?', (cutoff, last_id, chunk_size)).fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    archive.write(json.dumps({"id": row[0], "timestamp": row[1], "event_type": row[2], "entity_type": row[3],
+                                              "entity_id": row[4], "payload": json.loads(row[5])}, ensure_ascii=False) + "\n")
+                last_id = rows[-1][0]
+        os.replace(tmp_path, path)
+        with self.db.write_lock, self.db.writer:
+            self.db.writer.execute('DELETE FROM audit_log WHERE timestamp < ? AND id <= ?', (cutoff, last_id))
+        return path
@@ -0,0 +1,3 @@
+# قياس أداء FinanceManager ومسارات بيانات الصفحات على بيانات مولدة
+# python -m benchmarks.generate --db bench.db --transactions 100000
+# python -m benchmarks.run --db bench.db --output bench.json --compare baseline.json
@@ -0,0 +1,73 @@
+import argparse
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from finance_manager import FinanceManager
+
+PAYMENT_METHODS = ["كاش", "بطاقة ائتمان", "تحويل بنكي"]
+IN_CATEGORIES = ["راتب", "مكافأة", "استثمار", "إيجار", "هدية", "بيع", "عمولة", "أرباح"]
+OUT_CATEGORIES = ["أكل", "مواصلات", "فواتير", "إيجار", "تسوق", "صحة", "تعليم", "ترفيه", "سفر", "اتصالات", "صيانة", "تبرعات",
+                  "ملابس", "هدايا", "اشتراكات", "مطاعم"]
+
+def _zipf_weights(count):
+    # الفئة الأولى هي الأكثر استخدامًا، والباقي يتناقص بنسبة 1/الترتيب
+    return [1 / rank for rank in range(1, count + 1)]
+
+def generate(db_file, accounts=5, categories=12, transactions=10000, days=365, seed=42, chunk_size=10000):
+    if os.path.exists(db_file):
+        raise ValueError(f"الملف موجود مسبقًا: {db_file}")
+    rng = random.Random(seed)
+    fm = FinanceManager(db_file)
+    now = datetime.now().replace(microsecond=0)
+    account_ids = [fm.add_account(f"حساب {i + 1}", 10 ** 9, rng.choice([0, 1000, 5000])) for i in range(accounts)]
+    account_weights = _zipf_weights(accounts)
+    in_categories = IN_CATEGORIES[:max(1, categories // 3)]
+    out_categories = OUT_CATEGORIES[:max(1, categories - len(in_categories))]
+    for account_id in account_ids:
+        for name in in_categories:
+            fm.add_custom_category(account_id, "IN", name)
+        for name in out_categories:
+            fm.add_custom_category(account_id, "OUT", name)
+
+    started = time.perf_counter()
+    remaining = transactions
+    while remaining > 0:
+        batch = []
+        for _ in range(min(chunk_size, remaining)):
+            trans_type = "IN" if rng.random() < 0.2 else "OUT"
+            names = in_categories if trans_type == "IN" else out_categories
+            category = rng.choices(names, weights=_zipf_weights(len(names)))[0]
+            if rng.random() < 0.1:
+                category += "," + rng.choice(names)
+            # الأيام الأحدث أكثر كثافة: days_ago = days * u^2
+            days_ago = days * rng.random() ** 2
+            batch.append({
+                "account_id": rng.choices(account_ids, weights=account_weights)[0],
+                "amount": round(min(math.exp(rng.gauss(4.5 if trans_type == "OUT" else 7, 1)), 9000), 2),
+                "trans_type": trans_type,
+                "description": f"{category} #{rng.randint(1, 9999)}",
+                "payment_method": rng.choices(PAYMENT_METHODS, weights=[6, 3, 1])[0],
+                "category": category,
+                "date": (now - timedelta(days=days_ago)).strftime("%Y-%m-%d %H:%M:%S"),
+            })
+        fm.add_transactions_batch(batch)
+        remaining -= len(batch)
+    fm.audit.flush()
+    return {"db": db_file, "accounts": accounts, "categories": len(in_categories) + len(out_categories), "transactions": transactions,
+            "days": days, "seed": seed, "seconds": round(time.perf_counter() - started, 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description="توليد قاعدة بيانات تجريبية لقياس الأداء")
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--accounts", type=int, default=5)
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(generate(args.db, args.accounts, args.categories, args.transactions, args.days, args.seed))
+
+if __name__ == "__main__":
+    main()
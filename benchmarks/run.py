@@ -0,0 +1,179 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+from finance_manager import FinanceManager
+from chart_data import bar_data, balance_data
+from benchmarks.generate import generate
+
+REGRESSION_THRESHOLD = 1.2
+FILTER_NAMES = ["account_id", "start_date", "end_date", "trans_type", "category", "payment_method"]
+
+def measure(fn, repeat=5, cold=True, fm=None):
+    # cold: تفريغ ذاكرة القراءة المؤقتة قبل كل تشغيل حتى تُقاس الاستعلامات نفسها
+    timings = []
+    for _ in range(repeat):
+        if cold and fm is not None:
+            fm._cache.clear()
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "runs": repeat,
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+    }
+
+# مسارات البيانات في الصفحات بدون واجهة Streamlit: نفس الاستدعاءات ونفس بناء DataFrame
+def app_data(fm, account_id=None, start_date=None, days=None):
+    accounts = fm.get_page_context()["accounts"]
+    fm.get_totals(account_id=account_id, days=days)
+    account_df = pd.DataFrame(accounts, columns=["id", "name", "balance", "min_balance", "created_at"])
+    category_summary = pd.DataFrame(fm.category_totals(account_id=account_id, start_date=start_date, trans_type="OUT"), columns=["category", "amount"])
+    return account_df, category_summary
+
+def dashboard_data(fm, account_id=None, start_date=None, days=None):
+    accounts = fm.get_all_accounts()
+    account_options = {acc[0]: acc[1] for acc in accounts}
+    fm.get_totals(account_id=account_id, days=days)
+    balance_df = pd.DataFrame(balance_data(fm, account_ids=account_id, start=start_date)[1], columns=["account_id", "date", "balance"])
+    balance_df["account"] = balance_df["account_id"].map(account_options)
+    daily_df = pd.DataFrame(bar_data(fm, account_id=account_id, start_date=start_date)[1], columns=["date", "type", "amount"])
+    top_categories = fm.category_totals(account_id=account_id, start_date=start_date, trans_type="OUT")[:5]
+    return balance_df, daily_df, top_categories
+
+def reports_data(fm, **filters):
+    account_options = fm.get_page_context()["account_options"]
+    df = pd.DataFrame(fm.filter_transactions(**filters), columns=["id", "date", "type", "amount", "account_id", "description", "payment_method", "category"])
+    df["type"] = df["type"].replace({"IN": "وارد", "OUT": "منصرف"})
+    df["account"] = df["account_id"].map(account_options)
+    daily_df = pd.DataFrame(bar_data(fm, **filters)[1], columns=["date", "type", "amount"])
+    daily_df["type"] = daily_df["type"].replace({"IN": "وارد", "OUT": "منصرف"})
+    category_summary = pd.DataFrame(fm.category_totals(**filters), columns=["category", "amount"])
+    return df, daily_df, category_summary
+
+def concurrent_writes(fm, account_id, category, threads=16, per_thread=20):
+    # جلسات متزامنة تضيف معاملات في نفس الوقت، كما يحدث مع عدة مستخدمين في Streamlit
+    def work():
+        for _ in range(per_thread):
+            fm.add_transaction(account_id, 1, "IN", "bench", "كاش", category)
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+def run(fm, repeat=5):
+    results = {}
+    account_id = fm.get_all_accounts()[0][0]
+    category = fm.get_custom_categories(account_id, "OUT")[0][0]
+    start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+    end_date = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+    values = {"account_id": account_id, "start_date": start_date, "end_date": end_date, "trans_type": "OUT",
+              "category": category, "payment_method": "كاش"}
+
+    # القراءات
+    for size in range(len(FILTER_NAMES) + 1):
+        for names in itertools.combinations(FILTER_NAMES, size):
+            filters = {name: values[name] for name in names}
+            results[f"filter_transactions[{','.join(names) or 'none'}]"] = measure(lambda: fm.filter_transactions(**filters), repeat, fm=fm)
+    results["filter_transactions_page"] = measure(lambda: fm.filter_transactions_page(limit=50), repeat, fm=fm)
+    results["search_transactions"] = measure(lambda: fm.search_transactions(category), repeat, fm=fm)
+    results["get_totals[30d]"] = measure(lambda: fm.get_totals(days=30), repeat, fm=fm)
+    results["category_totals"] = measure(lambda: fm.category_totals(), repeat, fm=fm)
+    results["summarize[month,type]"] = measure(lambda: fm.summarize(group_by=["month", "type"]), repeat, fm=fm)
+    results["balance_timeline[day]"] = measure(lambda: fm.balance_timeline(freq="day"), repeat, fm=fm)
+    month_end = (datetime.now().replace(day=1) - timedelta(days=1)).strftime("%Y-%m-%d")
+    results["balances_as_of[month_end]"] = measure(lambda: fm.balances_as_of(month_end), repeat, fm=fm)
+    results["check_alerts"] = measure(fm.check_alerts, repeat, fm=fm)
+    results["check_alerts[warm]"] = measure(fm.check_alerts, repeat, cold=False)
+    results["get_custom_categories"] = measure(lambda: fm.get_custom_categories(account_id, "OUT"), repeat, fm=fm)
+    results["get_page_context"] = measure(fm.get_page_context, repeat, fm=fm)
+    results["get_custom_categories[warm]"] = measure(lambda: fm.get_custom_categories(account_id, "OUT"), repeat, cold=False)
+
+    # مسارات الصفحات
+    results["page:app"] = measure(lambda: app_data(fm), repeat, fm=fm)
+    results["page:app[30d]"] = measure(lambda: app_data(fm, start_date=start_date, days=30), repeat, fm=fm)
+    results["page:dashboard"] = measure(lambda: dashboard_data(fm), repeat, fm=fm)
+    results["page:dashboard[account,30d]"] = measure(lambda: dashboard_data(fm, account_id, start_date, 30), repeat, fm=fm)
+    results["page:reports"] = measure(lambda: reports_data(fm), repeat, fm=fm)
+    results["page:reports[account,OUT]"] = measure(lambda: reports_data(fm, account_id=account_id, trans_type="OUT"), repeat, fm=fm)
+
+    # الكتابات على نسخة مؤقتة من قاعدة البيانات، فتبقى بيانات --db كما هي وتقارن التشغيلات المتتالية نفس البيانات
+    with tempfile.TemporaryDirectory() as copy_dir:
+        copy_file = os.path.join(copy_dir, "bench-writes.db")
+        copy_conn = sqlite3.connect(copy_file)
+        fm.db.reader().backup(copy_conn)
+        copy_conn.close()
+        writer = FinanceManager(copy_file)
+        results["add_transaction"] = measure(lambda: writer.add_transaction(account_id, 10, "OUT", "bench", "كاش", category), repeat)
+        trans_id = writer.filter_transactions_page(limit=1, account_id=account_id)[0][0]
+        results["edit_transaction"] = measure(lambda: writer.edit_transaction(trans_id, account_id, 11, "OUT", "bench", "كاش", category), repeat)
+        results["add_transaction[16 threads]"] = measure(lambda: concurrent_writes(writer, account_id, category), repeat)
+        writer.close()
+        queued = FinanceManager(copy_file, write_queue=True)
+        results["add_transaction[16 threads, write_queue]"] = measure(lambda: concurrent_writes(queued, account_id, category), repeat)
+        queued.close()
+    return results
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    print(f"{'benchmark':<60} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:<60} {'-':>10} {result['median_ms']:>10.3f} {'new':>7}")
+            continue
+        ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        flag = " <-- regression" if ratio > threshold else ""
+        print(f"{name:<60} {base['median_ms']:>10.3f} {result['median_ms']:>10.3f} {ratio:>7.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس أداء FinanceManager ومسارات بيانات الصفحات")
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--transactions", type=int, default=10000, help="حجم البيانات إذا لم يكن الملف موجودًا")
+    parser.add_argument("--accounts", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--compare", help="ملف JSON من تشغيل سابق للمقارنة")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    dataset = None
+    if not os.path.exists(args.db):
+        dataset = generate(args.db, accounts=args.accounts, transactions=args.transactions, seed=args.seed)
+    fm = FinanceManager(args.db)
+    transactions = fm.db.reader().execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+    results = run(fm, args.repeat)
+    fm.audit.flush()
+    report = {
+        "meta": {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "db": args.db, "transactions": transactions,
+                 "repeat": args.repeat, "generated": dataset, "python": platform.python_version(), "sqlite": sqlite3.sqlite_version},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(report, output, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline:
+            regressions = compare(results, json.load(baseline)["results"], args.threshold)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
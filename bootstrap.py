@@ -0,0 +1,39 @@
+import streamlit as st
+from resources import get_finance_manager
+from styles import apply_sidebar_styles
+
+def bootstrap_page():
+    # الشريط الجانبي المشترك: قراءة واحدة من get_page_context تُستخدم هنا وفي محتوى الصفحة
+    apply_sidebar_styles()
+    fm = get_finance_manager()
+    context = fm.get_page_context()
+    account_options = context["account_options"]
+    with st.sidebar:
+        st.image("https://via.placeholder.com/50.png", width=50)
+        st.markdown("<h2>💰 FloosAfandy</h2>", unsafe_allow_html=True)
+        if context["unread_alerts"]:
+            st.markdown(f"<p style='text-align: center; color: #f1c40f;'>⚠️ {context['unread_alerts']} تنبيهات</p>", unsafe_allow_html=True)
+        st.markdown("<hr>", unsafe_allow_html=True)
+
+        st.markdown("<div class='section-title'>الصفحات</div>", unsafe_allow_html=True)
+        if st.button("💸 معاملاتي", key="nav_transactions"):
+            st.switch_page("pages/transactions.py")
+        if st.button("🏦 حساباتي", key="nav_accounts"):
+            st.switch_page("pages/accounts.py")
+        if st.button("📊 تقاريري", key="nav_reports"):
+            st.switch_page("pages/reports.py")
+        st.button("📈 لوحة التحكم", key="nav_dashboard", disabled=True)
+
+        st.markdown("<hr>", unsafe_allow_html=True)
+        st.markdown("<div class='section-title'>الإعدادات</div>", unsafe_allow_html=True)
+        with st.expander("⚙️ الفلاتر", expanded=False):
+            options_list = ["جميع الحسابات"] + list(account_options.keys())
+            st.selectbox("⏳ الفترة", ["الكل", "آخر 7 أيام", "آخر 30 يومًا", "آخر 90 يومًا"], key="time_range")
+            st.selectbox("🏦 الحساب", options=options_list,
+                         format_func=lambda x: "جميع الحسابات" if x == "جميع الحسابات" else account_options[x],
+                         key="selected_account")
+            if st.button("🔄 إعادة تعيين", key="reset_filters"):
+                st.session_state.time_range = "الكل"
+                st.session_state.selected_account = "جميع الحسابات"
+                st.rerun()
+    return fm, context
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+# حدود حجم بيانات الرسم المرسلة للمتصفح مهما طالت الفترة المختارة
+CHART_MAX_BUCKETS = 400
+CHART_MAX_POINTS = 1000
+# طول كل فترة تجميع بالأيام تقريبًا، من الأدق للأعم
+FREQ_DAYS = [("day", 1), ("week", 7), ("month", 30.44), ("year", 365.25)]
+FREQ_LABELS = {"day": "اليوم", "week": "الأسبوع", "month": "الشهر", "year": "السنة"}
+
+def pick_freq(first_date, last_date, max_buckets=CHART_MAX_BUCKETS):
+    # أدق فترة تجميع لا يتجاوز عدد فتراتها max_buckets
+    if not first_date or not last_date:
+        return "day"
+    days = (datetime.strptime(last_date[:10], "%Y-%m-%d") - datetime.strptime(first_date[:10], "%Y-%m-%d")).days + 1
+    for freq, length in FREQ_DAYS:
+        if days / length <= max_buckets:
+            return freq
+    return "year"
+
+def lttb(rows, threshold, value=lambda row: row[-1]):
+    # Largest-Triangle-Three-Buckets: تبقى النقطة الأولى والأخيرة، ومن كل مجموعة النقطة التي تصنع أكبر مثلث
+    # مع النقطة المختارة قبلها ومتوسط المجموعة التالية. x هو ترتيب النقطة لأن الصفوف مجمعة على فترات متساوية
+    count = len(rows)
+    if threshold >= count or threshold < 3:
+        return list(rows)
+    sampled = [rows[0]]
+    bucket_size = (count - 2) / (threshold - 2)
+    selected = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_bucket = range(end, min(int((i + 2) * bucket_size) + 1, count)) or range(count - 1, count)
+        average_x = sum(next_bucket) / len(next_bucket)
+        average_y = sum(value(rows[j]) for j in next_bucket) / len(next_bucket)
+        selected_y = value(rows[selected])
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((selected - average_x) * (value(rows[j]) - selected_y) - (selected - j) * (average_y - selected_y))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(rows[best])
+        selected = best
+    sampled.append(rows[-1])
+    return sampled
+
+def bar_data(fm, max_buckets=CHART_MAX_BUCKETS, **filters):
+    # الوارد والصادر لكل فترة، بدقة تعتمد على مدى تواريخ المعاملات المطابقة: (freq, [(bucket, type, amount)])
+    freq = pick_freq(*fm.date_span(**filters), max_buckets)
+    return freq, fm.summarize(group_by=[freq, "type"], **filters)
+
+def balance_data(fm, account_ids=None, start=None, end=None, max_points=CHART_MAX_POINTS):
+    # تطور الرصيد مجمعًا بدقة أعلى من المطلوب ثم مختصرًا بـ LTTB، بحد أقصى max_points لكل الحسابات معًا
+    first_date, last_date = fm.date_span(account_id=account_ids if isinstance(account_ids, int) else None, start_date=start, end_date=end)
+    freq = pick_freq(first_date, last_date, max_points * 10)
+    series = {}
+    for row in fm.balance_timeline(account_ids=account_ids, start=start, end=end, freq=freq):
+        series.setdefault(row[0], []).append(row)
+    per_series = max(3, max_points // max(len(series), 1))
+    return freq, [row for rows in series.values() for row in lttb(rows, per_series)]
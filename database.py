@@ -0,0 +1,218 @@
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from diagnostics import TRACER, TracedConnection
+
+# إعدادات الاتصال: انتظار القفل بدلًا من "database is locked"، ومزامنة أخف مع WAL، وذاكرة مؤقتة أكبر
+PRAGMAS = {
+    "busy_timeout": 5000,
+    "synchronous": "NORMAL",
+    "cache_size": -20000,
+    "mmap_size": 268435456,
+}
+
+class _ReaderHolder:
+    def __init__(self, conn):
+        self.conn = conn
+
+class ConnectionManager:
+    # اتصال قراءة لكل خيط (thread) واتصال كتابة واحد مشترك محمي بقفل
+    def __init__(self, db_file="finance.db"):
+        self.db_file = db_file
+        self.write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = set()
+        self._readers_lock = threading.Lock()
+        self.data_version = 0
+        self._group_thread = None
+        self._savepoints = 0
+        self.writer = self._connect(check_same_thread=False)
+        if self.db_file != ":memory:":
+            self.writer.execute("PRAGMA journal_mode=WAL")
+
+    def _connect(self, check_same_thread=True, database=None, uri=False):
+        # مع التتبع تُغلف الاتصالات لتسجيل زمن وعدد صفوف كل استعلام
+        conn = sqlite3.connect(database or self.db_file, check_same_thread=check_same_thread, uri=uri,
+                               factory=TracedConnection if TRACER.enabled else sqlite3.Connection)
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def reader(self):
+        if self.db_file == ":memory:":
+            return self.writer
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            # check_same_thread=False حتى يغلقه close() من أي خيط، واستخدامه يبقى لخيطه فقط.
+            # Streamlit يشغل كل إعادة تنفيذ في خيط جديد، فالاتصال يُغلق عند انتهاء خيطه (مع بيانات threading.local)
+            conn = self._connect(check_same_thread=False)
+            conn.execute("PRAGMA query_only=1")
+            holder = self._local.holder = _ReaderHolder(conn)
+            with self._readers_lock:
+                self._readers.add(conn)
+            weakref.finalize(holder, self._release_reader, conn)
+        return holder.conn
+
+    def _release_reader(self, conn):
+        with self._readers_lock:
+            if conn not in self._readers:
+                return
+            self._readers.discard(conn)
+        conn.close()
+
+    def close(self):
+        with self._readers_lock:
+            readers = list(self._readers)
+            self._readers.clear()
+        for conn in readers:
+            conn.close()
+        with self.write_lock:
+            self.writer.close()
+
+    @contextmanager
+    def write(self):
+        # كل كتابة ترفع data_version حتى تُبطل نتائج القراءة المخزنة مؤقتًا
+        with self.write_lock:
+            if self._group_thread == threading.get_ident() or self.writer.in_transaction:
+                # داخل دفعة GroupCommitWriter أو كتابة أخرى: الكتابة SAVEPOINT يُلغى وحده عند الخطأ،
+                # والالتزام ورفع data_version للدفعة أو الكتابة الخارجية
+                self._savepoints += 1
+                name = f"write_{self._savepoints}"
+                self.writer.execute(f"SAVEPOINT {name}")
+                try:
+                    yield self.writer
+                except BaseException:
+                    self.writer.execute(f"ROLLBACK TO {name}")
+                    raise
+                finally:
+                    self.writer.execute(f"RELEASE {name}")
+                    self._savepoints -= 1
+            else:
+                # BEGIN IMMEDIATE قبل أول قراءة: قراءات الرصيد داخل الكتابة ترى آخر البيانات ولا تكتب عملية أخرى
+                # (reconcile.py أو عامل تقارير أو خادم ثانٍ) بينها وبين التحديث، فلا يضيع تحديث رصيد
+                self.writer.execute("BEGIN IMMEDIATE")
+                try:
+                    yield self.writer
+                    self.writer.commit()
+                except BaseException:
+                    self.writer.rollback()
+                    raise
+                finally:
+                    self.data_version += 1
+
+class SnapshotReader:
+    # لقطة قراءة ثابتة للتقارير الطويلة، لا تمر باتصالات الصفحات ولا بقفل الكتابة:
+    # اتصال mode=ro بمعاملة قراءة مفتوحة (مع WAL يبقى يرى البيانات كما كانت عند فتحه والكتابات مستمرة)،
+    # أو copy=True: نسخة في الذاكرة بـ backup API لا تمسك الملف بعد انتهاء النسخ
+    def __init__(self, db, copy=False):
+        self.db_file = db.db_file
+        version = db.data_version
+        if db.db_file == ":memory:":
+            self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+            with db.write_lock:
+                db.writer.backup(self.conn)
+        else:
+            uri = Path(db.db_file).absolute().as_uri() + "?mode=ro"
+            if copy:
+                self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+                source = sqlite3.connect(uri, uri=True)
+                try:
+                    source.backup(self.conn)
+                finally:
+                    source.close()
+            else:
+                self.conn = db._connect(check_same_thread=False, database=uri, uri=True)
+                self.conn.execute("BEGIN")
+                self.conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        self.conn.execute("PRAGMA query_only=1")
+        # إذا لم تحدث كتابة أثناء الفتح فاللقطة تطابق إصدار البيانات الحالي، وإلا فلها إصدار خاص لا يطابق أي مفتاح
+        self.current = db.data_version == version
+        self.data_version = version if self.current else -1
+
+    def reader(self):
+        return self.conn
+
+    def write(self):
+        raise ValueError("اللقطة للقراءة فقط")
+
+    def close(self):
+        self.conn.close()
+
+class GroupCommitWriter:
+    # كاتب واحد لكل الجلسات: العمليات التي تصل خلال window ثانية من أول عملية تُنفذ في معاملة واحدة بالتزام واحد
+    # كل عملية تعيد Future بنتيجتها أو بخطئها (مثل "الرصيد غير كافٍ") ولا يؤثر خطأ عملية على باقي الدفعة
+    def __init__(self, db, window=0.001, max_batch=500):
+        self.db = db
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def in_writer(self):
+        return threading.get_ident() == self._thread.ident
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            # ما وصل أثناء الدفعة السابقة يُؤخذ فورًا، ثم انتظار window لمن يصل بعده
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while batch[-1] is not None and len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+            requests = [request for request in batch if request is not None]
+            if requests:
+                self._commit(requests)
+            if len(requests) < len(batch):
+                return
+
+    def _commit(self, requests):
+        results = []
+        with self.db.write_lock:
+            self.db._group_thread = threading.get_ident()
+            try:
+                self.db.writer.execute("BEGIN IMMEDIATE")
+                for future, fn, args, kwargs in requests:
+                    if future.set_running_or_notify_cancel():
+                        try:
+                            results.append((future, fn(*args, **kwargs), None))
+                        except Exception as e:
+                            results.append((future, None, e))
+                self.db.writer.commit()
+            except Exception as e:
+                # فشل الالتزام نفسه يُلغي الدفعة كلها ويُبلغ كل العمليات
+                traceback.print_exc()
+                self.db.writer.rollback()
+                results = [(future, None, e) for future, _, _, _ in requests if not future.cancelled()]
+            finally:
+                self.db._group_thread = None
+                self.db.data_version += 1
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
@@ -0,0 +1,180 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# التتبع اختياري: FLOOSAFANDY_TRACE=1 عند تشغيل التطبيق، وبدونه لا تُغلف الاتصالات ولا تُسجل أزمنة الصفحات
+TRACE_ENV = "FLOOSAFANDY_TRACE"
+TRACE_SAMPLES = 1000
+
+def _percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else 0.0
+
+def _normalize_sql(sql):
+    # قوائم المعاملات بأطوال مختلفة (?, ?, ?) تُعد استعلامًا واحدًا
+    return re.sub(r"\?(\s*,\s*\?)+", "?, ...", " ".join(sql.split()))
+
+def _params_shape(parameters):
+    if isinstance(parameters, dict):
+        return f"named:{len(parameters)}"
+    try:
+        return f"positional:{len(parameters)}"
+    except TypeError:
+        return "iterable"
+
+class Tracer:
+    # إحصاءات مجمعة لكل استعلام ولكل قسم في الصفحات، مع آخر TRACE_SAMPLES قياس لحساب p50/p95/p99
+    def __init__(self, enabled=False, samples=TRACE_SAMPLES):
+        self.enabled = enabled
+        self.samples = samples
+        self.started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._lock = threading.RLock()
+        self._queries = {}
+        self._pages = {}
+
+    def _record(self, stats, key, duration, rows=0):
+        with self._lock:
+            entry = stats.get(key)
+            if entry is None:
+                entry = stats[key] = {"count": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0, "samples": deque(maxlen=self.samples)}
+            duration_ms = duration * 1000
+            entry["count"] += 1
+            entry["rows"] += rows
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["samples"].append(duration_ms)
+
+    def record_query(self, sql, shape, duration, rows):
+        if self.enabled:
+            self._record(self._queries, (_normalize_sql(sql), shape), duration, rows)
+
+    def record_page(self, page, section, duration):
+        if self.enabled:
+            self._record(self._pages, (page, section), duration)
+
+    def _summaries(self, stats, names):
+        with self._lock:
+            items = [(key, dict(entry, samples=sorted(entry["samples"]))) for key, entry in stats.items()]
+        rows = []
+        for key, entry in items:
+            samples = entry.pop("samples")
+            rows.append(dict(zip(names, key), count=entry["count"], rows=entry["rows"], total_ms=round(entry["total_ms"], 3),
+                             max_ms=round(entry["max_ms"], 3), p50_ms=round(_percentile(samples, 0.50), 3),
+                             p95_ms=round(_percentile(samples, 0.95), 3), p99_ms=round(_percentile(samples, 0.99), 3)))
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def query_stats(self):
+        return self._summaries(self._queries, ["sql", "params"])
+
+    def page_stats(self):
+        return [{name: value for name, value in row.items() if name != "rows"} for row in self._summaries(self._pages, ["page", "section"])]
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._pages.clear()
+            self.started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def export_json(self):
+        return json.dumps({"started_at": self.started_at, "exported_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                           "queries": self.query_stats(), "pages": self.page_stats()}, ensure_ascii=False, indent=2)
+
+TRACER = Tracer(enabled=os.environ.get(TRACE_ENV) == "1")
+
+class TracedCursor(sqlite3.Cursor):
+    # زمن الاستعلام = زمن execute + زمن جلب الصفوف، ويُسجل عند انتهاء الجلب
+    _pending = None
+
+    def _finish(self, duration=0.0, rows=0):
+        pending = self._pending
+        if pending:
+            self._pending = None
+            TRACER.record_query(pending[0], pending[1], pending[2] + duration, pending[3] + rows)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._pending = [sql, _params_shape(parameters), time.perf_counter() - started, 0]
+        if self.description is None:
+            self._finish(rows=max(self.rowcount, 0))
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._pending = [sql, "many", time.perf_counter() - started, 0]
+        self._finish(rows=max(self.rowcount, 0))
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._finish(time.perf_counter() - started, 1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        if self._pending:
+            self._pending[2] += time.perf_counter() - started
+            self._pending[3] += len(rows)
+            if len(rows) < size:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._finish(time.perf_counter() - started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish(time.perf_counter() - started)
+            raise
+        if self._pending:
+            self._pending[2] += time.perf_counter() - started
+            self._pending[3] += 1
+        return row
+
+    def __del__(self):
+        self._finish()
+
+class TracedConnection(sqlite3.Connection):
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+class PageTimer:
+    # lap(section) يضيف الزمن منذ آخر lap إلى القسم، و done() في نهاية الصفحة يسجل مجموع كل قسم والإجمالي
+    def __init__(self, page, tracer=TRACER):
+        self.page = page
+        self.tracer = tracer
+        self.started = self._last = time.perf_counter()
+        self.sections = {}
+
+    def lap(self, section):
+        now = time.perf_counter()
+        self.sections[section] = self.sections.get(section, 0.0) + now - self._last
+        self._last = now
+
+    def done(self):
+        if self.tracer.enabled:
+            for section, duration in self.sections.items():
+                self.tracer.record_page(self.page, section, duration)
+            self.tracer.record_page(self.page, "total", time.perf_counter() - self.started)
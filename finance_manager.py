@@ -1,52 +1,423 @@
+import csv
+import io
+import json
 import sqlite3
-from datetime import datetime
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+from audit import AuditLog
+from database import ConnectionManager, GroupCommitWriter, SnapshotReader
+
+# توحيد الحروف العربية للبحث: أشكال الألف والتاء المربوطة والألف المقصورة، وحذف التشكيل والتطويل
+ARABIC_NORMALIZATION = {"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ة": "ه", "ى": "ي", "ؤ": "و", "ئ": "ي", "ـ": ""}
+ARABIC_NORMALIZATION.update({chr(code): "" for code in range(0x064B, 0x0653)})
+
+_ARABIC_TRANSLATION = str.maketrans(ARABIC_NORMALIZATION)
+
+def normalize_arabic(text):
+    return (text or "").translate(_ARABIC_TRANSLATION)
+
+def _normalize_arabic_sql(expr):
+    # نفس normalize_arabic لكن كتعبير SQL حتى تعمل المشغلات (triggers) من أي اتصال بقاعدة البيانات
+    for char, replacement in ARABIC_NORMALIZATION.items():
+        expr = f"replace({expr}, '{char}', '{replacement}')"
+    return expr
+
+def _fts_values_sql(row):
+    return (f"{row}.id, {_normalize_arabic_sql(f'{row}.description')}, {_normalize_arabic_sql(f'{row}.category')}, "
+            f"{_normalize_arabic_sql(f'{row}.payment_method')}, "
+            f"{_normalize_arabic_sql(f'(SELECT name FROM accounts WHERE id = {row}.account_id)')}")
+
+def _link_transaction_categories(conn, rows):
+    # rows: (transaction_id, account_id, type, category) حيث category نص الفئات مفصولة بفواصل كما في عمود transactions.category
+    links = [(trans_id, account_id, trans_type, name.strip()) for trans_id, account_id, trans_type, category in rows
+             for name in (category or "").split(",") if name.strip()]
+    # الأسماء غير الموجودة (مثل "غير مصنف" أو فئات ملف مستورد) تُنشأ بـ is_auto = 1 للربط فقط ولا تظهر في قوائم الفئات
+    conn.executemany('INSERT OR IGNORE INTO custom_categories (account_id, transaction_type, category_name, is_auto) VALUES (?, ?, ?, 1)', 
+                     {link[1:] for link in links})
+    conn.executemany('INSERT OR IGNORE INTO transaction_categories (transaction_id, category_id) '
+                     'SELECT ?, id FROM custom_categories WHERE account_id = ? AND transaction_type = ? AND category_name = ?', links)
+
+def _migrate_transaction_categories(conn):
+    _link_transaction_categories(conn, conn.execute('SELECT id, account_id, type, category FROM transactions').fetchall())
+
+_BULK_LOAD_OFF_SQL = "NOT EXISTS (SELECT 1 FROM metadata WHERE key = 'bulk_load')"
+_SIGNED_AMOUNT_SQL = "CASE WHEN type = 'IN' THEN amount ELSE -amount END"
+_RECONCILED_THROUGH_SQL = "(SELECT CAST(value AS INTEGER) FROM metadata WHERE key = 'reconciled_through_id')"
+
+def _reconciliation_delta_sql(row, sign):
+    return (f"INSERT INTO reconciliation (account_id, ledger_net) VALUES ({row}.account_id, "
+            f"{sign}CASE WHEN {row}.type = 'IN' THEN {row}.amount ELSE -{row}.amount END) "
+            "ON CONFLICT (account_id) DO UPDATE SET ledger_net = ledger_net + excluded.ledger_net;")
+
+def _add_column(table, column, definition):
+    # ADD COLUMN لا يقبل IF NOT EXISTS، فيُتخطى إذا كان العمود موجودًا
+    def add(conn):
+        if column not in [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return add
+
+# كل ترحيل: (رقم الإصدار، أوامر SQL أو دوال تستقبل الاتصال). تُنفذ بالترتيب مرة واحدة لكل قاعدة بيانات
+def _migrate_logs_to_audit(conn):
+    # السجل النصي القديم يُنقل إلى audit_log كأحداث "legacy" ثم يُحذف جدول logs
+    conn.execute('CREATE TABLE IF NOT EXISTS audit_log (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, event_type TEXT NOT NULL, '
+                 'entity_type TEXT, entity_id INTEGER, payload TEXT)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log (timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON audit_log (entity_type, entity_id, timestamp)')
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'logs'").fetchone():
+        conn.executemany("INSERT INTO audit_log (timestamp, event_type, payload) VALUES (?, 'legacy', ?)",
+                         ((timestamp or "", json.dumps({"message": event}, ensure_ascii=False))
+                          for event, timestamp in conn.execute('SELECT event, timestamp FROM logs ORDER BY id').fetchall()))
+        conn.execute('DROP TABLE logs')
+
+MIGRATIONS = [
+    (1, [
+        'CREATE INDEX IF NOT EXISTS idx_transactions_account_date ON transactions (account_id, date)',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_type_date ON transactions (type, date)',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions (category)',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_payment_method ON transactions (payment_method)',
+        'DELETE FROM custom_categories WHERE id NOT IN (SELECT MIN(id) FROM custom_categories GROUP BY account_id, transaction_type, category_name)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_custom_categories_unique ON custom_categories (account_id, transaction_type, category_name)',
+    ]),
+    (2, [
+        'CREATE TABLE IF NOT EXISTS daily_totals (account_id INTEGER, day TEXT NOT NULL, type TEXT NOT NULL, category TEXT, total REAL DEFAULT 0.0, count INTEGER DEFAULT 0, PRIMARY KEY (account_id, day, type, category))',
+        'CREATE INDEX IF NOT EXISTS idx_daily_totals_day ON daily_totals (day, type)',
+        'DELETE FROM daily_totals',
+        "INSERT INTO daily_totals (account_id, day, type, category, total, count) SELECT account_id, substr(date, 1, 10), type, COALESCE(category, ''), SUM(amount), COUNT(*) FROM transactions GROUP BY 1, 2, 3, 4",
+    ]),
+    (3, [
+        'CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date)',
+    ]),
+    (4, [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(description, category, payment_method, account_name, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN "
+        f"INSERT INTO transactions_fts (rowid, description, category, payment_method, account_name) VALUES ({_fts_values_sql('new')}); END",
+        f"CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE ON transactions BEGIN "
+        f"DELETE FROM transactions_fts WHERE rowid = old.id; "
+        f"INSERT INTO transactions_fts (rowid, description, category, payment_method, account_name) VALUES ({_fts_values_sql('new')}); END",
+        "CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN "
+        "DELETE FROM transactions_fts WHERE rowid = old.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS transactions_fts_account_rename AFTER UPDATE OF name ON accounts BEGIN "
+        f"UPDATE transactions_fts SET account_name = {_normalize_arabic_sql('new.name')} WHERE rowid IN (SELECT id FROM transactions WHERE account_id = new.id); END",
+        'DELETE FROM transactions_fts',
+        f"INSERT INTO transactions_fts (rowid, description, category, payment_method, account_name) SELECT {_fts_values_sql('t')} FROM transactions t",
+    ]),
+    (5, [
+        'CREATE TABLE IF NOT EXISTS transaction_categories (transaction_id INTEGER NOT NULL, category_id INTEGER NOT NULL, PRIMARY KEY (category_id, transaction_id), FOREIGN KEY (transaction_id) REFERENCES transactions (id), FOREIGN KEY (category_id) REFERENCES custom_categories (id)) WITHOUT ROWID',
+        'CREATE INDEX IF NOT EXISTS idx_transaction_categories_transaction ON transaction_categories (transaction_id)',
+        'CREATE INDEX IF NOT EXISTS idx_custom_categories_name ON custom_categories (category_name)',
+        # الربط يكتب is_auto، والعمود يُضاف هنا لقواعد البيانات الأقدم من الترحيل 14
+        _add_column('custom_categories', 'is_auto', 'INTEGER NOT NULL DEFAULT 0'),
+        _migrate_transaction_categories,
+    ]),
+    (6, [
+        "INSERT OR IGNORE INTO metadata (key, value) VALUES ('revision', '0')",
+        *[f"CREATE TRIGGER IF NOT EXISTS revision_{table}_{event.lower()} AFTER {event} ON {table} BEGIN "
+          f"UPDATE metadata SET value = value + 1 WHERE key = 'revision'; END"
+          for table in ("transactions", "accounts") for event in ("INSERT", "UPDATE", "DELETE")],
+        'CREATE TABLE IF NOT EXISTS report_jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, cache_key TEXT NOT NULL, format TEXT NOT NULL, filters TEXT, status TEXT NOT NULL, artifact TEXT, error TEXT, created_at TEXT, finished_at TEXT)',
+        'CREATE INDEX IF NOT EXISTS idx_report_jobs_cache_key ON report_jobs (cache_key, status)',
+    ]),
+    (7, [
+        "CREATE TABLE IF NOT EXISTS budgets (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, amount REAL NOT NULL, spent REAL DEFAULT 0.0, account_id INTEGER, category TEXT NOT NULL, period TEXT NOT NULL DEFAULT 'monthly', start_date TEXT NOT NULL, end_date TEXT NOT NULL, created_at TEXT, FOREIGN KEY (account_id) REFERENCES accounts (id))",
+        'CREATE INDEX IF NOT EXISTS idx_budgets_account_category ON budgets (account_id, category, start_date)',
+    ]),
+    (8, [
+        'CREATE TABLE IF NOT EXISTS alerts (id INTEGER PRIMARY KEY AUTOINCREMENT, rule TEXT NOT NULL, account_id INTEGER, message TEXT NOT NULL, created_at TEXT, is_read INTEGER DEFAULT 0)',
+        'CREATE INDEX IF NOT EXISTS idx_alerts_unread ON alerts (id) WHERE is_read = 0',
+        "INSERT INTO alerts (rule, account_id, message, created_at) SELECT 'min_balance_alert', id, '⚠️ الرصيد في حساب ' || name || ' أقل من الحد الأدنى!', "
+        "datetime('now', 'localtime') FROM accounts WHERE balance < min_balance",
+    ]),
+    (9, [_migrate_logs_to_audit]),
+    (10, [
+        # صافي المعاملات التراكمي (الوارد - الصادر) لكل حساب حتى نهاية الشهر period بصيغة YYYY-MM
+        'CREATE TABLE IF NOT EXISTS balance_snapshots (account_id INTEGER NOT NULL, period TEXT NOT NULL, net REAL NOT NULL, PRIMARY KEY (account_id, period))',
+    ]),
+    (11, [
+        # الرصيد الافتتاحي يُستنتج من الرصيد الحالي لأن الأرصدة القديمة لم تُحفظ، والمطابقة تبدأ من هنا
+        _add_column('accounts', 'opening_balance', 'REAL DEFAULT 0.0'),
+        f'UPDATE accounts SET opening_balance = balance - COALESCE((SELECT SUM({_SIGNED_AMOUNT_SQL}) FROM transactions WHERE account_id = accounts.id), 0)',
+        # صافي المعاملات حتى reconciled_through_id لكل حساب، وتعديل أو حذف معاملة قديمة يُحدثه من المشغلات مهما كان مصدره
+        'CREATE TABLE IF NOT EXISTS reconciliation (account_id INTEGER PRIMARY KEY, ledger_net REAL NOT NULL DEFAULT 0.0)',
+        f"CREATE TRIGGER IF NOT EXISTS reconciliation_transactions_update AFTER UPDATE OF type, amount, account_id ON transactions "
+        f"WHEN old.id <= {_RECONCILED_THROUGH_SQL} BEGIN "
+        f"{_reconciliation_delta_sql('old', '-')} {_reconciliation_delta_sql('new', '')} END",
+        f"CREATE TRIGGER IF NOT EXISTS reconciliation_transactions_delete AFTER DELETE ON transactions "
+        f"WHEN old.id <= {_RECONCILED_THROUGH_SQL} BEGIN {_reconciliation_delta_sql('old', '-')} END",
+    ]),
+    (12, [
+        # بصمة المعاملات المستوردة من كشوف البنوك لرفض تكرار استيراد نفس الحركة، والمعاملات اليدوية بدون بصمة
+        _add_column('transactions', 'fingerprint', 'TEXT'),
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_fingerprint ON transactions (fingerprint) WHERE fingerprint IS NOT NULL',
+        # الإدخال المجمع يضيف فهرس البحث ويرفع المراجعة مرة واحدة للدفعة، فتتوقف مشغلات الإدخال لكل صف أثناءه
+        'DROP TRIGGER IF EXISTS transactions_fts_insert',
+        f"CREATE TRIGGER transactions_fts_insert AFTER INSERT ON transactions WHEN {_BULK_LOAD_OFF_SQL} BEGIN "
+        f"INSERT INTO transactions_fts (rowid, description, category, payment_method, account_name) VALUES ({_fts_values_sql('new')}); END",
+        'DROP TRIGGER IF EXISTS revision_transactions_insert',
+        f"CREATE TRIGGER revision_transactions_insert AFTER INSERT ON transactions WHEN {_BULK_LOAD_OFF_SQL} BEGIN "
+        "UPDATE metadata SET value = value + 1 WHERE key = 'revision'; END",
+    ]),
+    (13, [
+        # UPDATE OF name يعمل كلما ذُكر الاسم في SET حتى لو لم يتغير، و edit_account يذكره دائمًا
+        'DROP TRIGGER IF EXISTS transactions_fts_account_rename',
+        f"CREATE TRIGGER transactions_fts_account_rename AFTER UPDATE OF name ON accounts WHEN old.name IS NOT new.name BEGIN "
+        f"UPDATE transactions_fts SET account_name = {_normalize_arabic_sql('new.name')} WHERE rowid IN (SELECT id FROM transactions WHERE account_id = new.id); END",
+    ]),
+    (14, [
+        # فئات أنشأها ربط المعاملات وليس المستخدم؛ "غير مصنف" هي الفئة الافتراضية في الصفحات وليست فئة مستخدم
+        _add_column('custom_categories', 'is_auto', 'INTEGER NOT NULL DEFAULT 0'),
+        "UPDATE custom_categories SET is_auto = 1 WHERE category_name = 'غير مصنف'",
+    ]),
+    (15, [
+        # الإدخال المجمع يحذف مشغلات الإدخال ويعيدها داخل معاملته، فشرط bulk_load لم يعد لازمًا وتقييمه كان يكلف كل إدخال
+        'DROP TRIGGER IF EXISTS transactions_fts_insert',
+        f"CREATE TRIGGER transactions_fts_insert AFTER INSERT ON transactions BEGIN "
+        f"INSERT INTO transactions_fts (rowid, description, category, payment_method, account_name) VALUES ({_fts_values_sql('new')}); END",
+        'DROP TRIGGER IF EXISTS revision_transactions_insert',
+        "CREATE TRIGGER revision_transactions_insert AFTER INSERT ON transactions BEGIN "
+        "UPDATE metadata SET value = value + 1 WHERE key = 'revision'; END",
+        "DELETE FROM metadata WHERE key = 'bulk_load'",
+    ]),
+]
+
+READ_CACHE_SIZE = 256
+# حد مجموع صفوف النتائج المخزنة، فلا تبقى نسخ كاملة من دفتر كبير لكل تركيبة فلاتر. النتيجة الأكبر منه لا تُخزن
+READ_CACHE_ROWS = 100000
+
+BUDGET_PERIODS = ("monthly", "weekly", "custom")
+
+LARGE_TRANSACTION_AMOUNT = 10000
+ALERT_RULES = []
+
+def alert_rule(rule):
+    # قاعدة التنبيه تستقبل (conn, event) وتعيد نص التنبيه أو None، وتُطبق على أحداث كل عملية كتابة داخل نفس المعاملة
+    # event["kind"]: "balance" أو "transaction" أو "budget"
+    ALERT_RULES.append(rule)
+    return rule
+
+@alert_rule
+def min_balance_alert(conn, event):
+    if event["kind"] == "balance" and event["old_balance"] >= event["old_min_balance"] and event["new_balance"] < event["min_balance"]:
+        name = conn.execute('SELECT name FROM accounts WHERE id = ?', (event["account_id"],)).fetchone()[0]
+        return f"⚠️ الرصيد في حساب {name} أقل من الحد الأدنى!"
+
+@alert_rule
+def budget_overrun_alert(conn, event):
+    if event["kind"] == "budget" and event["old_spent"] <= event["amount"] < event["new_spent"]:
+        return f"⚠️ تم تجاوز الميزانية {event['name']}: {event['new_spent']:,.2f}/{event['amount']:,.2f}"
+
+@alert_rule
+def large_transaction_alert(conn, event):
+    if event["kind"] == "transaction" and event["amount"] >= LARGE_TRANSACTION_AMOUNT:
+        return f"⚠️ معاملة كبيرة بقيمة {event['amount']:,.2f}"
+
+def _budget_period(period, today, start_date=None, end_date=None):
+    # حدود الفترة الحالية للميزانية كنصوص YYYY-MM-DD، الأسبوع يبدأ يوم الاثنين
+    if period == "monthly":
+        start = today.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    elif period == "weekly":
+        start = today - timedelta(days=today.weekday())
+        end = start + timedelta(days=6)
+    elif period == "custom":
+        if not start_date or not end_date:
+            raise ValueError("يجب تحديد بداية ونهاية الفترة المخصصة")
+        if str(start_date)[:10] > str(end_date)[:10]:
+            raise ValueError("بداية الفترة يجب أن تسبق نهايتها")
+        return str(start_date)[:10], str(end_date)[:10]
+    else:
+        raise ValueError(f"فترة غير مدعومة: {period}")
+    return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+# أعمدة المعاملات كما تعيدها دوال القراءة، بدون الأعمدة الداخلية مثل fingerprint
+TRANSACTION_COLUMNS = "id, date, type, amount, account_id, description, payment_method, category"
+EXPORT_COLUMNS = ["id", "date", "type", "amount", "account_id", "account", "description", "payment_method", "category"]
+
+# أعمدة التجميع والمقاييس المسموح بها في summarize
+SUMMARY_GROUPS = {
+    "type": "t.type",
+    "category": "c.category_name",
+    "payment_method": "t.payment_method",
+    "account": "t.account_id",
+    "day": "substr(t.date, 1, 10)",
+    "week": "strftime('%Y-%W', t.date)",
+    "month": "substr(t.date, 1, 7)",
+    "year": "substr(t.date, 1, 4)",
+}
+SUMMARY_METRICS = {"sum": "SUM(t.amount)", "count": "COUNT(*)", "avg": "AVG(t.amount)"}
+
+def cached_read(method):
+    # نتائج القراءة تُخزن حسب المعاملات ورقم إصدار البيانات، فلا تُلمس قاعدة البيانات إذا لم يتغير شيء.
+    # data_version يزيد مع كتابات هذه العملية فقط: كتابة من عملية أخرى (مثل reconcile.py --repair من cron أو عامل تقارير)
+    # لا تظهر هنا حتى أول كتابة في هذه العملية، والقيم التي تعتمد على الوقت تُمرر كمعاملات حتى تكون جزءًا من المفتاح
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        freeze = lambda value: tuple(value) if isinstance(value, list) else value
+        key = (method.__name__, tuple(map(freeze, args)), tuple((name, freeze(value)) for name, value in sorted(kwargs.items())), self.db.data_version)
+        try:
+            with self._cache_lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    return self._cache[key][0]
+        except TypeError:
+            return method(self, *args, **kwargs)
+        result = method(self, *args, **kwargs)
+        rows = len(result) if isinstance(result, list) else 1
+        if rows > READ_CACHE_ROWS:
+            return result
+        with self._cache_lock:
+            self._cache[key] = (result, rows)
+            while len(self._cache) > READ_CACHE_SIZE or sum(entry[1] for entry in self._cache.values()) > READ_CACHE_ROWS:
+                self._cache.popitem(last=False)
+        return result
+    return wrapper
+
+def queued_write(method):
+    # مع write_queue تُنفذ العملية في خيط الكاتب الواحد وينتظر المستدعي نتيجتها، وبدونه تُنفذ مباشرة كما هي
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.write_queue is None or self.write_queue.in_writer():
+            return method(self, *args, **kwargs)
+        return self.write_queue.submit(method, self, *args, **kwargs).result()
+    wrapper.direct = method
+    return wrapper
 
 class FinanceManager:
-    def __init__(self, db_file="finance.db"):
+    def __init__(self, db_file="finance.db", write_queue=False):
         self.db_file = db_file
-        self.conn = sqlite3.connect(self.db_file)
+        self.db = ConnectionManager(db_file)
+        self.conn = self.db.writer
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.write_queue = None
         self.create_tables()
+        self.audit = AuditLog(self.db)
+        if write_queue:
+            self.write_queue = GroupCommitWriter(self.db)
+
+    def close(self):
+        # ينتظر الكتابات المعلقة في الطابور وسجل التدقيق ثم يغلق الاتصالات
+        if self.write_queue is not None:
+            self.write_queue.close()
+        self.audit.close()
+        self.db.close()
+
+    def submit(self, method_name, *args, **kwargs):
+        # يعيد Future بنتيجة عملية الكتابة (أو خطئها) دون انتظار؛ يتطلب write_queue
+        if self.write_queue is None:
+            raise ValueError("طابور الكتابة غير مفعل")
+        method = getattr(type(self), method_name)
+        return self.write_queue.submit(getattr(method, "direct", method), self, *args, **kwargs)
+
+    def snapshot(self, copy=False):
+        # نسخة للقراءة فقط من المدير كل استعلاماتها من لقطة واحدة ثابتة، للتقارير التي يجب ألا ترى نصف تغيير
+        # ولا تزاحم إدخال المعاملات؛ تُغلق بـ close() أو with. copy=True تنسخ البيانات للذاكرة (انظر SnapshotReader)
+        # ترحيل لقطات الأرصدة والميزانيات يكتب، فيُنفذ هنا قبل فتح اللقطة
+        self._roll_snapshots()
+        self._roll_budgets()
+        return ReportSnapshot(self, copy=copy)
 
     def create_tables(self):
-        with self.conn:
+        with self.db.write():
             self.conn.execute('CREATE TABLE IF NOT EXISTS accounts (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, balance REAL DEFAULT 0.0, min_balance REAL DEFAULT 0.0, created_at TEXT)')
             self.conn.execute('CREATE TABLE IF NOT EXISTS transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, type TEXT NOT NULL, amount REAL NOT NULL, account_id INTEGER, description TEXT, payment_method TEXT, category TEXT, FOREIGN KEY (account_id) REFERENCES accounts (id))')
             self.conn.execute('CREATE TABLE IF NOT EXISTS custom_categories (id INTEGER PRIMARY KEY AUTOINCREMENT, account_id INTEGER, transaction_type TEXT NOT NULL, category_name TEXT NOT NULL, FOREIGN KEY (account_id) REFERENCES accounts (id))')
-            self.conn.execute('CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, event TEXT, timestamp TEXT)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)')
+        self.migrate()
+
+    def get_revision(self):
+        # رقم يزيد مع كل تغيير في المعاملات أو الحسابات، من أي عملية أو اتصال
+        return int(self.db.reader().execute("SELECT value FROM metadata WHERE key = 'revision'").fetchone()[0])
 
+    def get_schema_version(self):
+        row = self.conn.execute("SELECT value FROM metadata WHERE key = 'schema_version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def migrate(self):
+        # كل ترحيل في معاملة BEGIN IMMEDIATE يُعاد فيها قراءة الإصدار، فإذا فتحت عدة عمليات أو خيوط نفس الملف معًا
+        # يُنفذه أولها فقط ويتخطاه الباقون بعد انتظار قفل الكتابة
+        for version, statements in MIGRATIONS:
+            if version <= self.get_schema_version():
+                continue
+            with self.db.write_lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if version > self.get_schema_version():
+                        for statement in statements:
+                            if callable(statement):
+                                statement(self.conn)
+                            else:
+                                self.conn.execute(statement)
+                        self.conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('schema_version', ?)", (str(version),))
+                    self.conn.commit()
+                except BaseException:
+                    self.conn.rollback()
+                    raise
+                finally:
+                    self.db.data_version += 1
+
+    @queued_write
     def add_account(self, account_name, opening_balance=0.0, min_balance=0.0):
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with self.conn:
-            cursor = self.conn.execute('INSERT INTO accounts (name, balance, min_balance, created_at) VALUES (?, ?, ?, ?)', 
-                                       (account_name, opening_balance, min_balance, created_at))
-            self.conn.execute('INSERT INTO logs (event, timestamp) VALUES (?, ?)', (f"تم إضافة حساب: {account_name}", created_at))
+        with self.db.write():
+            cursor = self.conn.execute('INSERT INTO accounts (name, balance, opening_balance, min_balance, created_at) VALUES (?, ?, ?, ?, ?)', 
+                                       (account_name, opening_balance, opening_balance, min_balance, created_at))
+            self.audit.log("account_added", "account", cursor.lastrowid, {"name": account_name, "opening_balance": opening_balance, "min_balance": min_balance})
             return cursor.lastrowid
 
+    @queued_write
+    def edit_account(self, account_id, account_name, balance, min_balance):
+        with self.db.write():
+            before = self._account_balances([account_id])
+            # تعديل الرصيد يدويًا تسوية مقصودة تُحمل على الرصيد الافتتاحي حتى لا تظهر كفرق في المطابقة
+            self.conn.execute('UPDATE accounts SET name = ?, opening_balance = opening_balance + ? - balance, balance = ?, min_balance = ? WHERE id = ?', 
+                              (account_name, balance, balance, min_balance, account_id))
+            self._raise_alerts(self._balance_events(before))
+            self.audit.log("account_edited", "account", account_id, {"name": account_name, "balance": balance, "min_balance": min_balance})
+
+    @queued_write
+    def delete_account(self, account_id):
+        with self.db.write():
+            self.conn.execute('DELETE FROM accounts WHERE id = ?', (account_id,))
+            self.conn.execute('DELETE FROM balance_snapshots WHERE account_id = ?', (account_id,))
+            self.conn.execute('DELETE FROM reconciliation WHERE account_id = ?', (account_id,))
+            self.audit.log("account_deleted", "account", account_id)
+
+    @queued_write
     def add_custom_category(self, account_id, transaction_type, category_name):
-        with self.conn:
-            exists = self.conn.execute('SELECT 1 FROM custom_categories WHERE account_id = ? AND transaction_type = ? AND category_name = ?', 
-                                       (account_id, transaction_type, category_name)).fetchone()
-            if exists:
-                raise ValueError("الفئة موجودة مسبقًا لهذا الحساب ونوع المعاملة!")
-            cursor = self.conn.execute('INSERT INTO custom_categories (account_id, transaction_type, category_name) VALUES (?, ?, ?)', 
-                                       (account_id, transaction_type, category_name))
-            self.conn.execute('INSERT INTO logs (event, timestamp) VALUES (?, ?)', 
-                              (f"تم إضافة فئة: {category_name}", datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-            return cursor.lastrowid
+        with self.db.write():
+            # فئة أُنشئت تلقائيًا بنفس الاسم تصبح فئة مستخدم وتبقى معاملاتها مربوطة بها
+            row = self.conn.execute('SELECT id FROM custom_categories WHERE account_id = ? AND transaction_type = ? AND category_name = ? AND is_auto = 1', 
+                                    (account_id, transaction_type, category_name)).fetchone()
+            if row:
+                category_id = row[0]
+                self.conn.execute('UPDATE custom_categories SET is_auto = 0 WHERE id = ?', (category_id,))
+            else:
+                try:
+                    category_id = self.conn.execute('INSERT INTO custom_categories (account_id, transaction_type, category_name) VALUES (?, ?, ?)', 
+                                                    (account_id, transaction_type, category_name)).lastrowid
+                except sqlite3.IntegrityError:
+                    raise ValueError("الفئة موجودة مسبقًا لهذا الحساب ونوع المعاملة!")
+            self.audit.log("category_added", "category", category_id, {"account_id": account_id, "transaction_type": transaction_type, "name": category_name})
+            return category_id
 
+    @cached_read
     def get_custom_categories(self, account_id, transaction_type):
-        return self.conn.execute('SELECT category_name FROM custom_categories WHERE account_id = ? AND transaction_type = ?', 
+        return self.db.reader().execute('SELECT category_name FROM custom_categories WHERE account_id = ? AND transaction_type = ? AND is_auto = 0', 
                                  (account_id, transaction_type)).fetchall()
 
+    @queued_write
     def delete_custom_category(self, category_id):
-        with self.conn:
-            self.conn.execute('DELETE FROM custom_categories WHERE id = ?', (category_id,))
-            self.conn.execute('INSERT INTO logs (event, timestamp) VALUES (?, ?)', 
-                              (f"تم حذف فئة: {category_id}", datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        # الفئة تُخفى من القوائم (is_auto = 1) ولا تُحذف، فتبقى المعاملات السابقة مربوطة بها في الفلاتر والمجاميع والميزانيات
+        with self.db.write():
+            self.conn.execute('UPDATE custom_categories SET is_auto = 1 WHERE id = ?', (category_id,))
+            self.audit.log("category_deleted", "category", category_id)
 
+    @queued_write
     def add_transaction(self, account_id, amount, trans_type, description="", payment_method="كاش", category=""):
         date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with self.conn:
+        with self.db.write():
             account = self.conn.execute('SELECT balance, min_balance FROM accounts WHERE id = ?', (account_id,)).fetchone()
             if not account:
                 raise ValueError("الحساب غير موجود")
@@ -54,20 +425,115 @@ class FinanceManager:
                 raise ValueError("المبلغ يجب أن يكون موجبًا")
             if trans_type == "OUT" and account[0] < amount:
                 raise ValueError("الرصيد غير كافٍ")
-            self.conn.execute('INSERT INTO transactions (date, type, amount, account_id, description, payment_method, category) VALUES (?, ?, ?, ?, ?, ?, ?)', 
-                              (date, trans_type, amount, account_id, description, payment_method, category))
+            cursor = self.conn.execute('INSERT INTO transactions (date, type, amount, account_id, description, payment_method, category) VALUES (?, ?, ?, ?, ?, ?, ?)', 
+                                       (date, trans_type, amount, account_id, description, payment_method, category))
+            _link_transaction_categories(self.conn, [(cursor.lastrowid, account_id, trans_type, category)])
             new_balance = account[0] + amount if trans_type == "IN" else account[0] - amount
             self.conn.execute('UPDATE accounts SET balance = ? WHERE id = ?', (new_balance, account_id))
-            self.conn.execute('INSERT INTO logs (event, timestamp) VALUES (?, ?)', (f"تم إضافة معاملة: {trans_type}", date))
+            self._update_rollups([(account_id, date, trans_type, category, amount, 1)])
+            self._raise_alerts([{"kind": "balance", "account_id": account_id, "old_balance": account[0], "new_balance": new_balance,
+                                 "old_min_balance": account[1], "min_balance": account[1]},
+                                {"kind": "transaction", "account_id": account_id, "amount": amount, "trans_type": trans_type}])
+            self.audit.log("transaction_added", "transaction", cursor.lastrowid, {"account_id": account_id, "amount": amount, "type": trans_type, "category": category})
             if new_balance < account[1]:
                 return "تنبيه: الرصيد أقل من الحد الأدنى"
 
+    def _batch_rows(self, transactions):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = []
+        for trans in transactions:
+            if trans["amount"] <= 0:
+                raise ValueError("المبلغ يجب أن يكون موجبًا")
+            rows.append((trans.get("date") or now, trans["trans_type"], trans["amount"], trans["account_id"],
+                         trans.get("description", ""), trans.get("payment_method", "كاش"), trans.get("category", ""), trans.get("fingerprint")))
+        return rows
+
+    @queued_write
+    def add_transactions_batch(self, transactions):
+        # كل عنصر: dict بنفس مفاتيح add_transaction (account_id, amount, trans_type, description, payment_method, category) + date و fingerprint اختياريان
+        rows = self._batch_rows(transactions)
+        if not rows:
+            return None
+        with self.db.write():
+            return self._insert_batch(rows)
+
+    @queued_write
+    def import_transactions_batch(self, transactions):
+        # مثل add_transactions_batch لكن كل عنصر له fingerprint، والمكرر (في القاعدة أو داخل الدفعة) يُتجاهل بدل رفض الدفعة
+        # يعيد (عدد المضاف، عدد المكرر، تنبيه الحد الأدنى أو None)
+        rows = self._batch_rows(transactions)
+        with self.db.write():
+            existing = self._existing_fingerprints(self.conn, [row[7] for row in rows])
+            unique_rows = []
+            for row in rows:
+                if row[7] not in existing:
+                    existing.add(row[7])
+                    unique_rows.append(row)
+            warning = self._insert_batch(unique_rows) if unique_rows else None
+        return len(unique_rows), len(rows) - len(unique_rows), warning
+
+    def existing_fingerprints(self, fingerprints):
+        return self._existing_fingerprints(self.db.reader(), fingerprints)
+
+    def _existing_fingerprints(self, conn, fingerprints, chunk_size=500):
+        found = set()
+        fingerprints = list(fingerprints)
+        for i in range(0, len(fingerprints), chunk_size):
+            chunk = fingerprints[i:i + chunk_size]
+            found.update(row[0] for row in conn.execute('SELECT fingerprint FROM transactions WHERE fingerprint IN (' + ', '.join('?' * len(chunk)) + ')', chunk))
+        return found
+
+    def _insert_batch(self, rows):
+        # داخل write(): rows من _batch_rows
+        balances = {}
+        account_names = {}
+        for account_id in {row[3] for row in rows}:
+            account = self.conn.execute('SELECT balance, min_balance, name FROM accounts WHERE id = ?', (account_id,)).fetchone()
+            if not account:
+                raise ValueError("الحساب غير موجود")
+            balances[account_id] = list(account[:2])
+            account_names[account_id] = normalize_arabic(account[2])
+        before = self._account_balances(balances)
+        # بالترتيب الزمني: الإدخال في فهارس التاريخ متقارب بدل مواضع عشوائية، وفحص الرصيد بترتيب حدوث المعاملات
+        rows = sorted(rows, key=lambda row: row[0])
+        for date, trans_type, amount, account_id, _, _, _, _ in rows:
+            balance = balances[account_id]
+            if trans_type == "OUT" and balance[0] < amount:
+                raise ValueError("الرصيد غير كافٍ")
+            balance[0] = balance[0] + amount if trans_type == "IN" else balance[0] - amount
+        # مشغلات الإدخال لكل صف تُحذف وتُعاد داخل نفس المعاملة، فلا تراها الاتصالات الأخرى محذوفة،
+        # ويُضاف فهرس البحث ويُرفع الإصدار هنا مرة واحدة للدفعة
+        triggers = self.conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ('transactions_fts_insert', 'revision_transactions_insert')").fetchall()
+        for name, _ in triggers:
+            self.conn.execute(f'DROP TRIGGER {name}')
+        self.conn.executemany('INSERT INTO transactions (date, type, amount, account_id, description, payment_method, category, fingerprint) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        for _, sql in triggers:
+            self.conn.execute(sql)
+        # الأرقام متتالية لأن AUTOINCREMENT وكل الإدخالات داخل نفس المعاملة وتحت قفل الكتابة
+        last_id = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()[0]
+        self.conn.executemany('INSERT INTO transactions_fts (rowid, description, category, payment_method, account_name) VALUES (?, ?, ?, ?, ?)',
+                              [(last_id - len(rows) + 1 + i, normalize_arabic(row[4]), normalize_arabic(row[6]), normalize_arabic(row[5]), account_names[row[3]])
+                               for i, row in enumerate(rows)])
+        self.conn.execute("UPDATE metadata SET value = value + 1 WHERE key = 'revision'")
+        _link_transaction_categories(self.conn, [(last_id - len(rows) + 1 + i, row[3], row[1], row[6]) for i, row in enumerate(rows)])
+        self.conn.executemany('UPDATE accounts SET balance = ? WHERE id = ?',
+                              [(balance, account_id) for account_id, (balance, _) in balances.items()])
+        self._update_rollups([(row[3], row[0], row[1], row[6], row[2], 1) for row in rows])
+        self._raise_alerts(self._balance_events(before) + [{"kind": "transaction", "account_id": row[3], "amount": row[2], "trans_type": row[1]}
+                                                           for row in rows])
+        self.audit.log("transactions_batch_added", "transaction", last_id, {"count": len(rows), "first_id": last_id - len(rows) + 1,
+                                                                          "accounts": sorted(balances)})
+        if any(balance < min_balance for balance, min_balance in balances.values()):
+            return "تنبيه: الرصيد أقل من الحد الأدنى"
+
+    @queued_write
     def edit_transaction(self, trans_id, account_id, amount, trans_type, description, payment_method, category):
-        with self.conn:
-            old_trans = self.conn.execute('SELECT type, amount, account_id FROM transactions WHERE id = ?', (trans_id,)).fetchone()
+        with self.db.write():
+            old_trans = self.conn.execute('SELECT type, amount, account_id, date, category FROM transactions WHERE id = ?', (trans_id,)).fetchone()
             if not old_trans:
                 raise ValueError("المعاملة غير موجودة")
-            old_type, old_amount, old_account_id = old_trans
+            old_type, old_amount, old_account_id, old_date, old_category = old_trans
+            before = self._account_balances({old_account_id, account_id})
             account = self.conn.execute('SELECT balance, min_balance FROM accounts WHERE id = ?', (account_id,)).fetchone()
             if not account:
                 raise ValueError("الحساب غير موجود")
@@ -76,7 +542,7 @@ class FinanceManager:
                 temp_balance = current_balance - old_amount if old_type == "IN" else current_balance + old_amount
             else:
                 self.conn.execute('UPDATE accounts SET balance = balance + ? WHERE id = ?', 
-                                  (old_amount if old_type == "IN" else -old_amount, old_account_id))
+                                  (-old_amount if old_type == "IN" else old_amount, old_account_id))
                 temp_balance = current_balance
             if amount <= 0:
                 raise ValueError("المبلغ يجب أن يكون موجبًا")
@@ -87,12 +553,82 @@ class FinanceManager:
             date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             self.conn.execute('UPDATE transactions SET date = ?, type = ?, amount = ?, account_id = ?, description = ?, payment_method = ?, category = ? WHERE id = ?', 
                               (date, trans_type, amount, account_id, description, payment_method, category, trans_id))
-            self.conn.execute('INSERT INTO logs (event, timestamp) VALUES (?, ?)', (f"تم تعديل معاملة: {trans_id}", date))
+            self.conn.execute('DELETE FROM transaction_categories WHERE transaction_id = ?', (trans_id,))
+            _link_transaction_categories(self.conn, [(trans_id, account_id, trans_type, category)])
+            self._update_rollups([(old_account_id, old_date, old_type, old_category, -old_amount, -1),
+                                       (account_id, date, trans_type, category, amount, 1)])
+            self._raise_alerts(self._balance_events(before) + [{"kind": "transaction", "account_id": account_id, "amount": amount, "trans_type": trans_type}])
+            self.audit.log("transaction_edited", "transaction", trans_id, {"old": {"account_id": old_account_id, "amount": old_amount, "type": old_type, "category": old_category},
+                                                                          "new": {"account_id": account_id, "amount": amount, "type": trans_type, "category": category}})
             if new_balance < min_balance:
                 return "تنبيه: الرصيد أقل من الحد الأدنى"
 
-    def filter_transactions(self, account_id=None, start_date=None, end_date=None, trans_type=None, category=None, payment_method=None):
-        query = 'SELECT * FROM transactions WHERE 1=1'
+    @queued_write
+    def delete_transaction(self, trans_id):
+        with self.db.write():
+            old_trans = self.conn.execute('SELECT type, amount, account_id, date, category FROM transactions WHERE id = ?', (trans_id,)).fetchone()
+            if not old_trans:
+                raise ValueError("المعاملة غير موجودة")
+            old_type, old_amount, old_account_id, old_date, old_category = old_trans
+            before = self._account_balances([old_account_id])
+            self.conn.execute('UPDATE accounts SET balance = balance + ? WHERE id = ?', 
+                              (-old_amount if old_type == "IN" else old_amount, old_account_id))
+            self.conn.execute('DELETE FROM transaction_categories WHERE transaction_id = ?', (trans_id,))
+            self.conn.execute('DELETE FROM transactions WHERE id = ?', (trans_id,))
+            self._update_rollups([(old_account_id, old_date, old_type, old_category, -old_amount, -1)])
+            self._raise_alerts(self._balance_events(before))
+            self.audit.log("transaction_deleted", "transaction", trans_id, {"account_id": old_account_id, "amount": old_amount, "type": old_type, "category": old_category})
+
+    def _update_rollups(self, changes):
+        # كل تغيير: (account_id, date, type, category, amount, count) ويُطبق على daily_totals و budgets داخل نفس معاملة قاعدة البيانات
+        grouped = {}
+        for account_id, date, trans_type, category, amount, count in changes:
+            key = (account_id, date[:10], trans_type, category or "")
+            total, total_count = grouped.get(key, (0.0, 0))
+            grouped[key] = (total + amount, total_count + count)
+        self.conn.executemany('INSERT INTO daily_totals (account_id, day, type, category, total, count) VALUES (?, ?, ?, ?, ?, ?) '
+                              'ON CONFLICT (account_id, day, type, category) DO UPDATE SET total = total + excluded.total, count = count + excluded.count',
+                              [key + value for key, value in grouped.items()])
+        self.conn.executemany('DELETE FROM daily_totals WHERE account_id = ? AND day = ? AND type = ? AND category = ? AND count <= 0', list(grouped))
+        budget_changes = [(total, account_id, name.strip(), day) for (account_id, day, trans_type, category), (total, _) in grouped.items()
+                          if trans_type == "OUT" for name in category.split(",") if name.strip()]
+        self.conn.executemany('UPDATE budgets SET spent = spent + ? WHERE account_id = ? AND category = ? AND ? BETWEEN start_date AND end_date', budget_changes)
+        # التعديل بتاريخ قديم يُضاف فرقه للقطات شهره وما بعده بدلًا من إعادة بنائها
+        snapshot_changes = {}
+        for (account_id, day, trans_type, _), (total, _) in grouped.items():
+            key = (account_id, day[:7])
+            snapshot_changes[key] = snapshot_changes.get(key, 0.0) + (total if trans_type == "IN" else -total)
+        self.conn.executemany('UPDATE balance_snapshots SET net = net + ? WHERE account_id = ? AND period >= ?',
+                              [(net, account_id, period) for (account_id, period), net in snapshot_changes.items() if net])
+        events = []
+        for total, account_id, name, day in budget_changes:
+            if total > 0:
+                for budget_id, budget_name, amount, spent in self.conn.execute('SELECT id, name, amount, spent FROM budgets WHERE account_id = ? AND category = ? AND ? BETWEEN start_date AND end_date', 
+                                                                             (account_id, name, day)):
+                    events.append({"kind": "budget", "account_id": account_id, "budget_id": budget_id, "name": budget_name,
+                                   "amount": amount, "old_spent": spent - total, "new_spent": spent})
+        self._raise_alerts(events)
+
+    def get_totals(self, account_id=None, days=None):
+        # إجمالي الوارد والصادر من جدول daily_totals لآخر N يوم (days = 0 لليوم فقط، None لكل الفترات)
+        # تاريخ البداية يُحسب هنا ويدخل في مفتاح الذاكرة المؤقتة، فلا تبقى أرقام الأمس بعد منتصف الليل
+        since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d") if days is not None else None
+        return self._totals(account_id, since)
+
+    @cached_read
+    def _totals(self, account_id, since):
+        query = "SELECT COALESCE(SUM(CASE WHEN type = 'IN' THEN total END), 0), COALESCE(SUM(CASE WHEN type = 'OUT' THEN total END), 0) FROM daily_totals WHERE 1=1"
+        params = []
+        if account_id:
+            query += ' AND account_id = ?'
+            params.append(account_id)
+        if since is not None:
+            query += ' AND day >= ?'
+            params.append(since)
+        return self.db.reader().execute(query, params).fetchone()
+
+    def _filter_clause(self, account_id=None, start_date=None, end_date=None, trans_type=None, category=None, payment_method=None):
+        query = ' WHERE 1=1'
         params = []
         if account_id:
             query += ' AND account_id = ?'
@@ -107,30 +643,424 @@ class FinanceManager:
             query += ' AND type = ?'
             params.append(trans_type)
         if category:
-            query += ' AND category LIKE ?'
-            params.append(f"%{category}%")
+            query += (' AND id IN (SELECT tc.transaction_id FROM transaction_categories tc '
+                      'JOIN custom_categories c ON c.id = tc.category_id WHERE c.category_name = ?)')
+            params.append(category)
         if payment_method:
             query += ' AND payment_method = ?'
             params.append(payment_method)
-        return self.conn.execute(query, params).fetchall()
+        return query, params
 
+    @cached_read
+    def filter_transactions(self, account_id=None, start_date=None, end_date=None, trans_type=None, category=None, payment_method=None):
+        where, params = self._filter_clause(account_id, start_date, end_date, trans_type, category, payment_method)
+        return self.db.reader().execute('SELECT ' + TRANSACTION_COLUMNS + ' FROM transactions' + where, params).fetchall()
+
+    @cached_read
+    def filter_transactions_page(self, limit=50, after=None, **filters):
+        # صفحة من المعاملات مرتبة من الأحدث، after = (date, id) لآخر صف في الصفحة السابقة
+        where, params = self._filter_clause(**filters)
+        if after:
+            where += ' AND (date, id) < (?, ?)'
+            params.extend(after)
+        return self.db.reader().execute('SELECT ' + TRANSACTION_COLUMNS + ' FROM transactions' + where + ' ORDER BY date DESC, id DESC LIMIT ?', params + [limit]).fetchall()
+
+    def iter_transactions(self, chunk_size=1000, **filters):
+        where, params = self._filter_clause(**filters)
+        cursor = self.db.reader().execute('SELECT ' + TRANSACTION_COLUMNS + ' FROM transactions' + where + ' ORDER BY date, id', params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+    @cached_read
+    def category_totals(self, **filters):
+        # مجموع المبالغ لكل فئة، المعاملة ذات الفئات المتعددة تُحسب في كل فئة منها
+        where, params = self._filter_clause(**filters)
+        return self.db.reader().execute('SELECT c.category_name, SUM(t.amount) FROM (SELECT id, amount FROM transactions' + where + ') t '
+                                        'JOIN transaction_categories tc ON tc.transaction_id = t.id JOIN custom_categories c ON c.id = tc.category_id '
+                                        'GROUP BY c.category_name ORDER BY SUM(t.amount) DESC', params).fetchall()
+
+    @cached_read
+    def summarize(self, account_id=None, start=None, end=None, group_by=("type",), metrics=("sum",), **filters):
+        # تجميع في استعلام SQL واحد، يعيد صفًا لكل مجموعة: قيم group_by ثم قيم metrics بنفس الترتيب
+        for name in group_by:
+            if name not in SUMMARY_GROUPS:
+                raise ValueError(f"تجميع غير مدعوم: {name}")
+        for name in metrics:
+            if name not in SUMMARY_METRICS:
+                raise ValueError(f"مقياس غير مدعوم: {name}")
+        where, params = self._filter_clause(account_id=account_id, **{"start_date": start, "end_date": end, **filters})
+        columns = [SUMMARY_GROUPS[name] for name in group_by]
+        query = 'SELECT ' + ', '.join(columns + [SUMMARY_METRICS[name] for name in metrics]) + ' FROM (SELECT * FROM transactions' + where + ') t'
+        if "category" in group_by:
+            query += ' JOIN transaction_categories tc ON tc.transaction_id = t.id JOIN custom_categories c ON c.id = tc.category_id'
+        if columns:
+            query += ' GROUP BY ' + ', '.join(columns) + ' ORDER BY ' + ', '.join(columns)
+        return self.db.reader().execute(query, params).fetchall()
+
+    @cached_read
+    def date_span(self, **filters):
+        # أول وآخر تاريخ للمعاملات المطابقة، لاختيار دقة تجميع الرسوم البيانية
+        where, params = self._filter_clause(**filters)
+        return self.db.reader().execute('SELECT MIN(date), MAX(date) FROM transactions' + where, params).fetchone()
+
+    @cached_read
+    def balance_timeline(self, account_ids=None, start=None, end=None, freq=None):
+        # الرصيد الفعلي بعد كل معاملة لكل حساب: الرصيد الافتتاحي = الرصيد الحالي - صافي كل المعاملات
+        # freq = "day" / "week" / "month" / "year" يعيد آخر رصيد في كل فترة بدلًا من كل معاملة
+        if freq and freq not in ("day", "week", "month", "year"):
+            raise ValueError(f"فترة غير مدعومة: {freq}")
+        params = []
+        account_filter = ''
+        if account_ids:
+            account_ids = [account_ids] if isinstance(account_ids, int) else list(account_ids)
+            account_filter = ' WHERE tr.account_id IN (' + ', '.join('?' * len(account_ids)) + ')'
+            params.extend(account_ids)
+        query = ('WITH t AS (SELECT tr.account_id, tr.date, tr.id, '
+                 "a.balance - SUM(CASE WHEN tr.type = 'IN' THEN tr.amount ELSE -tr.amount END) OVER (PARTITION BY tr.account_id) "
+                 "+ SUM(CASE WHEN tr.type = 'IN' THEN tr.amount ELSE -tr.amount END) OVER (PARTITION BY tr.account_id ORDER BY tr.date, tr.id ROWS UNBOUNDED PRECEDING) AS balance "
+                 'FROM transactions tr JOIN accounts a ON a.id = tr.account_id' + account_filter + ') ')
+        where = ' WHERE 1=1'
+        if start:
+            where += ' AND t.date >= ?'
+            params.append(start)
+        if end:
+            where += ' AND t.date <= ?'
+            params.append(end)
+        if not freq:
+            query += 'SELECT t.account_id, t.date, t.balance FROM t' + where + ' ORDER BY t.account_id, t.date, t.id'
+        else:
+            bucket = SUMMARY_GROUPS[freq]
+            query += ('SELECT account_id, bucket, balance FROM (SELECT t.account_id, ' + bucket + ' AS bucket, t.balance, '
+                      'ROW_NUMBER() OVER (PARTITION BY t.account_id, ' + bucket + ' ORDER BY t.date DESC, t.id DESC) AS rn FROM t' + where + ') '
+                      'WHERE rn = 1 ORDER BY account_id, bucket')
+        return self.db.reader().execute(query, params).fetchall()
+
+    @queued_write
+    def reconcile(self, repair=False, full=False):
+        # الرصيد الصحيح = الرصيد الافتتاحي + صافي كل المعاملات. صافي المعاملات حتى reconciled_through_id محفوظ في reconciliation،
+        # فلا يُقرأ إلا ما بعده في استعلام مجمع واحد. full يعيد الحساب من أول معاملة
+        # GROUP BY +account_id يُبقي البحث على نطاق المفتاح الأساسي id > ? بدل مسح فهرس الحساب كاملًا
+        # repair يصحح accounts.balance للحسابات المختلفة في نفس المعاملة التي حُسب فيها الفرق
+        # db.write() يبدأ بـ BEGIN IMMEDIATE، فكل القراءات هنا من نفس الحالة ولا تُضاف معاملة من عملية أخرى بعد last_id
+        with self.db.write():
+            if full:
+                self.conn.execute('DELETE FROM reconciliation')
+                through_id = 0
+            else:
+                row = self.conn.execute("SELECT value FROM metadata WHERE key = 'reconciled_through_id'").fetchone()
+                through_id = int(row[0]) if row else 0
+            last_id = self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM transactions').fetchone()[0]
+            rows = self.conn.execute('SELECT a.id, a.name, a.balance, a.opening_balance, COALESCE(r.ledger_net, 0) + COALESCE(n.net, 0), COALESCE(n.scanned, 0) '
+                                     'FROM accounts a LEFT JOIN reconciliation r ON r.account_id = a.id LEFT JOIN '
+                                     f'(SELECT account_id, SUM({_SIGNED_AMOUNT_SQL}) AS net, COUNT(*) AS scanned FROM transactions WHERE id > ? AND id <= ? GROUP BY +account_id) n '
+                                     'ON n.account_id = a.id ORDER BY a.id', (through_id, last_id)).fetchall()
+            discrepancies = []
+            for account_id, name, balance, opening_balance, ledger_net, _ in rows:
+                expected = (opening_balance or 0.0) + ledger_net
+                if round(balance - expected, 2):
+                    discrepancies.append({"account_id": account_id, "name": name, "cached": balance, "expected": round(expected, 2),
+                                          "difference": round(balance - expected, 2)})
+            self.conn.executemany('INSERT OR REPLACE INTO reconciliation (account_id, ledger_net) VALUES (?, ?)', [(row[0], row[4]) for row in rows])
+            self.conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('reconciled_through_id', ?)", (str(max(last_id, through_id)),))
+            if repair and discrepancies:
+                before = self._account_balances([item["account_id"] for item in discrepancies])
+                self.conn.executemany('UPDATE accounts SET balance = ? WHERE id = ?', [(item["expected"], item["account_id"]) for item in discrepancies])
+                self._raise_alerts(self._balance_events(before))
+                for item in discrepancies:
+                    self.audit.log("balance_reconciled", "account", item["account_id"], {"cached": item["cached"], "expected": item["expected"]})
+            return {"from_id": through_id, "through_id": max(last_id, through_id), "accounts": len(rows), "scanned": sum(row[5] for row in rows),
+                    "discrepancies": discrepancies, "repaired": bool(repair and discrepancies)}
+
+    def _roll_snapshots(self):
+        # لقطات الأشهر المكتملة التي لم تُحسب بعد، من daily_totals مرة واحدة لكل شهر جديد
+        # الأشهر بلا حركة لا تُحفظ لها لقطة، والبحث يأخذ آخر لقطة قبل الشهر المطلوب
+        through = (datetime.now().date().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+        row = self.db.reader().execute("SELECT value FROM metadata WHERE key = 'snapshots_through'").fetchone()
+        if row and row[0] == through:
+            return
+        with self.db.write():
+            self.conn.execute('INSERT INTO balance_snapshots (account_id, period, net) '
+                              'SELECT account_id, period, COALESCE((SELECT net FROM balance_snapshots s WHERE s.account_id = m.account_id ORDER BY s.period DESC LIMIT 1), 0) '
+                              '+ SUM(net) OVER (PARTITION BY account_id ORDER BY period) FROM ('
+                              "SELECT d.account_id, substr(d.day, 1, 7) AS period, SUM(CASE WHEN d.type = 'IN' THEN d.total ELSE -d.total END) AS net "
+                              'FROM daily_totals d WHERE substr(d.day, 1, 7) <= ? '
+                              "AND substr(d.day, 1, 7) > COALESCE((SELECT MAX(s.period) FROM balance_snapshots s WHERE s.account_id = d.account_id), '') "
+                              'GROUP BY d.account_id, period) m', (through,))
+            self.conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('snapshots_through', ?)", (through,))
+
+    def balances_as_of(self, ts, account_ids=None):
+        # رصيد كل حساب في لحظة ts: الرصيد الحالي - صافي ما بعد ts، وصافي ما بعد ts يُحسب من لقطتين
+        # (آخر لقطة، وآخر لقطة قبل شهر ts) فلا تُجمع إلا معاملات ما بعد آخر لقطة ومعاملات شهر ts حتى ts
+        self._roll_snapshots()
+        ts = str(ts)
+        if len(ts) == 10:
+            ts += " 23:59:59"
+        return self._balances_as_of(ts, tuple(account_ids) if account_ids else None)
+
+    @cached_read
+    def _balances_as_of(self, ts, account_ids):
+        params = [ts[:7]]
+        account_filter = ''
+        if account_ids:
+            account_filter = ' WHERE a.id IN (' + ', '.join('?' * len(account_ids)) + ')'
+            params.extend(account_ids)
+        signed = "COALESCE(SUM(CASE WHEN type = 'IN' THEN amount ELSE -amount END), 0)"
+        # date > 'YYYY-MM-32' تعني بعد نهاية الشهر وتستخدم فهرس (account_id, date)
+        query = ('WITH s AS (SELECT a.id, a.balance, '
+                 "(SELECT period || '-32' FROM balance_snapshots WHERE account_id = a.id AND period < ?1 ORDER BY period DESC LIMIT 1) AS before_end, "
+                 '(SELECT net FROM balance_snapshots WHERE account_id = a.id AND period < ?1 ORDER BY period DESC LIMIT 1) AS before_net, '
+                 "(SELECT period || '-32' FROM balance_snapshots WHERE account_id = a.id ORDER BY period DESC LIMIT 1) AS last_end, "
+                 '(SELECT net FROM balance_snapshots WHERE account_id = a.id ORDER BY period DESC LIMIT 1) AS last_net '
+                 'FROM accounts a' + account_filter + ') '
+                 'SELECT id, balance - COALESCE(last_net, 0) + COALESCE(before_net, 0) '
+                 f"- (SELECT {signed} FROM transactions WHERE account_id = s.id AND date > COALESCE(last_end, '')) "
+                 f"+ (SELECT {signed} FROM transactions WHERE account_id = s.id AND date > COALESCE(before_end, '') AND date <= ?{len(params) + 1}) "
+                 'FROM s ORDER BY id')
+        return self.db.reader().execute(query, params + [ts]).fetchall()
+
+    def balance_as_of(self, account_id, ts):
+        rows = self.balances_as_of(ts, [account_id])
+        return rows[0][1] if rows else None
+
+    def export_csv(self, file, chunk_size=5000, **filters):
+        # يكتب المعاملات المطابقة في ملف ثنائي على دفعات من المؤشر دون تحميلها كلها في الذاكرة
+        account_names = {acc[0]: acc[1] for acc in self.get_all_accounts()}
+        text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_COLUMNS)
+        count = 0
+        for rows in self.iter_transactions(chunk_size=chunk_size, **filters):
+            writer.writerows(row[:5] + (account_names.get(row[4]),) + row[5:] for row in rows)
+            count += len(rows)
+        text.detach()
+        return count
+
+    def export_parquet(self, file, chunk_size=50000, **filters):
+        # نفس export_csv بصيغة Parquet، الأعمدة المتكررة (النوع، الحساب، طريقة الدفع، الفئة) مرمزة كقاموس
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        dictionary = pa.dictionary(pa.int32(), pa.string())
+        schema = pa.schema([("id", pa.int64()), ("date", pa.string()), ("type", dictionary), ("amount", pa.float64()),
+                            ("account_id", pa.int64()), ("account", dictionary), ("description", pa.string()),
+                            ("payment_method", dictionary), ("category", dictionary)])
+        account_names = {acc[0]: acc[1] for acc in self.get_all_accounts()}
+        count = 0
+        with pq.ParquetWriter(file, schema) as writer:
+            for rows in self.iter_transactions(chunk_size=chunk_size, **filters):
+                ids, dates, types, amounts, account_ids, descriptions, payment_methods, categories = zip(*rows)
+                columns = [ids, dates, types, amounts, account_ids, [account_names.get(account_id) for account_id in account_ids],
+                           descriptions, payment_methods, categories]
+                arrays = [pa.array(values, pa.string()).dictionary_encode() if field.type == dictionary else pa.array(values, field.type)
+                          for values, field in zip(columns, schema)]
+                writer.write_batch(pa.record_batch(arrays, schema=schema))
+                count += len(rows)
+        return count
+
+    @cached_read
+    def search_transactions(self, query, limit=50, offset=0):
+        # كل كلمة تُطابق كبادئة، مع أو بدون "ال" التعريف، والنتائج مرتبة حسب bm25
+        terms = []
+        for word in normalize_arabic(query).split():
+            word = word.replace('"', '""')
+            if word.startswith("ال") or not "\u0600" <= word[0] <= "\u06FF":
+                terms.append(f'"{word}"*')
+            else:
+                terms.append(f'("{word}"* OR "ال{word}"*)')
+        if not terms:
+            return []
+        return self.db.reader().execute('SELECT t.id, t.date, t.type, t.amount, t.account_id, t.description, t.payment_method, t.category FROM transactions_fts JOIN transactions t ON t.id = transactions_fts.rowid '
+                                 'WHERE transactions_fts MATCH ? ORDER BY transactions_fts.rank LIMIT ? OFFSET ?',
+                                 (" AND ".join(terms), limit, offset)).fetchall()
+
+    @cached_read
     def get_all_accounts(self):
-        return self.conn.execute('SELECT * FROM accounts').fetchall()
+        return self.db.reader().execute('SELECT id, name, balance, min_balance, created_at FROM accounts').fetchall()
+
+    @cached_read
+    def get_page_context(self):
+        # ما تحتاجه كل صفحة (الحسابات، عدد التنبيهات غير المقروءة، الفئات) في استعلام واحد
+        rows = self.db.reader().execute(
+            "SELECT 'account', id, name, balance, min_balance, created_at FROM accounts "
+            "UNION ALL SELECT 'alerts', COUNT(*), NULL, NULL, NULL, NULL FROM alerts WHERE is_read = 0 "
+            "UNION ALL SELECT 'category', account_id, transaction_type, category_name, NULL, NULL FROM custom_categories WHERE is_auto = 0").fetchall()
+        context = {"accounts": [], "account_options": {}, "unread_alerts": 0, "categories": {}}
+        for kind, *values in rows:
+            if kind == "account":
+                context["accounts"].append(tuple(values))
+                context["account_options"][values[0]] = values[1]
+            elif kind == "alerts":
+                context["unread_alerts"] = values[0]
+            else:
+                context["categories"].setdefault((values[0], values[1]), []).append(values[2])
+        return context
 
+    @cached_read
     def get_all_transactions(self):
-        return self.conn.execute('SELECT * FROM transactions').fetchall()
+        return self.db.reader().execute('SELECT ' + TRANSACTION_COLUMNS + ' FROM transactions').fetchall()
 
-    def check_alerts(self):
+    def _account_balances(self, account_ids):
+        return {account_id: self.conn.execute('SELECT balance, min_balance FROM accounts WHERE id = ?', (account_id,)).fetchone()
+                for account_id in account_ids}
+
+    def _balance_events(self, before):
+        # before: {account_id: (balance, min_balance)} قبل التعديل، تُقارن بالقيم الحالية داخل نفس المعاملة
+        events = []
+        for account_id, (old_balance, old_min_balance) in before.items():
+            account = self.conn.execute('SELECT balance, min_balance FROM accounts WHERE id = ?', (account_id,)).fetchone()
+            if account:
+                events.append({"kind": "balance", "account_id": account_id, "old_balance": old_balance, "new_balance": account[0],
+                               "old_min_balance": old_min_balance, "min_balance": account[1]})
+        return events
+
+    def _raise_alerts(self, events):
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         alerts = []
-        accounts = self.get_all_accounts()
-        for acc in accounts:
-            if acc[2] < acc[3]:
-                alerts.append(f"⚠️ الرصيد في حساب {acc[1]} أقل من الحد الأدنى!")
-        return alerts
+        for rule in ALERT_RULES:
+            for event in events:
+                message = rule(self.conn, event)
+                if message:
+                    alerts.append((rule.__name__, event.get("account_id"), message, created_at))
+        self.conn.executemany('INSERT INTO alerts (rule, account_id, message, created_at) VALUES (?, ?, ?, ?)', alerts)
+
+    @cached_read
+    def count_unread_alerts(self):
+        return self.db.reader().execute('SELECT COUNT(*) FROM alerts WHERE is_read = 0').fetchone()[0]
+
+    @cached_read
+    def get_alerts(self, unread_only=True, limit=50):
+        query = 'SELECT id, rule, account_id, message, created_at, is_read FROM alerts'
+        if unread_only:
+            query += ' WHERE is_read = 0'
+        return self.db.reader().execute(query + ' ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+
+    @queued_write
+    def mark_alerts_read(self, alert_ids=None):
+        with self.db.write():
+            if alert_ids is None:
+                self.conn.execute('UPDATE alerts SET is_read = 1 WHERE is_read = 0')
+            else:
+                self.conn.executemany('UPDATE alerts SET is_read = 1 WHERE id = ?', [(alert_id,) for alert_id in alert_ids])
+
+    def check_alerts(self):
+        # التنبيهات غير المقروءة من جدول alerts، تُحسب عند الكتابة وليس بفحص كل الحسابات
+        return [alert[3] for alert in self.get_alerts(unread_only=True)]
    # داخل class FinanceManager
+    @queued_write
     def delete_custom_category_by_name(self, account_id, transaction_type, category_name):
-        with self.conn:
-            self.conn.execute('DELETE FROM custom_categories WHERE account_id = ? AND transaction_type = ? AND category_name = ?', 
+        # مثل delete_custom_category: إخفاء مع بقاء ربط المعاملات السابقة
+        with self.db.write():
+            self.conn.execute('UPDATE custom_categories SET is_auto = 1 WHERE account_id = ? AND transaction_type = ? AND category_name = ?', 
                               (account_id, transaction_type, category_name))
-            self.conn.execute('INSERT INTO logs (event, timestamp) VALUES (?, ?)', 
-                              (f"تم حذف فئة: {category_name}", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))) 
+            self.audit.log("category_deleted", "category", None, {"account_id": account_id, "transaction_type": transaction_type, "name": category_name})
+
+    def add_report_job(self, cache_key, report_format, filters):
+        with self.db.write():
+            cursor = self.conn.execute('INSERT INTO report_jobs (cache_key, format, filters, status, created_at) VALUES (?, ?, ?, ?, ?)', 
+                                       (cache_key, report_format, filters, "pending", datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            return cursor.lastrowid
+
+    def get_report_job(self, job_id):
+        return self.db.reader().execute('SELECT * FROM report_jobs WHERE id = ?', (job_id,)).fetchone()
+
+    def find_report_job(self, cache_key):
+        return self.db.reader().execute("SELECT * FROM report_jobs WHERE cache_key = ? AND status != 'failed' ORDER BY id DESC LIMIT 1", 
+                                        (cache_key,)).fetchone()
+
+    def update_report_job(self, job_id, status, artifact=None, error=None):
+        finished_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S") if status in ("done", "failed") else None
+        with self.db.write():
+            self.conn.execute('UPDATE report_jobs SET status = ?, artifact = ?, error = ?, finished_at = ? WHERE id = ?', 
+                              (status, artifact, error, finished_at, job_id))
+
+    def _budget_spent(self, account_id, category, start_date, end_date):
+        return self.conn.execute("SELECT COALESCE(SUM(t.amount), 0) FROM transactions t "
+                                 "JOIN transaction_categories tc ON tc.transaction_id = t.id JOIN custom_categories c ON c.id = tc.category_id "
+                                 "WHERE t.account_id = ? AND t.date >= ? AND t.date <= ? AND t.type = 'OUT' AND c.category_name = ?", 
+                                 (account_id, start_date, end_date + " 23:59:59", category)).fetchone()[0]
+
+    @queued_write
+    def add_budget(self, name, amount, account_id, category, period="monthly", start_date=None, end_date=None):
+        if amount <= 0:
+            raise ValueError("المبلغ يجب أن يكون موجبًا")
+        start_date, end_date = _budget_period(period, datetime.now().date(), start_date, end_date)
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.db.write():
+            spent = self._budget_spent(account_id, category, start_date, end_date)
+            cursor = self.conn.execute('INSERT INTO budgets (name, amount, spent, account_id, category, period, start_date, end_date, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', 
+                                       (name, amount, spent, account_id, category, period, start_date, end_date, created_at))
+            self.audit.log("budget_added", "budget", cursor.lastrowid, {"name": name, "amount": amount, "account_id": account_id, "category": category, "period": period})
+            return cursor.lastrowid
+
+    @queued_write
+    def edit_budget(self, budget_id, name, amount, category):
+        if amount <= 0:
+            raise ValueError("المبلغ يجب أن يكون موجبًا")
+        with self.db.write():
+            budget = self.conn.execute('SELECT account_id, category, start_date, end_date FROM budgets WHERE id = ?', (budget_id,)).fetchone()
+            if not budget:
+                raise ValueError("الميزانية غير موجودة")
+            account_id, old_category, start_date, end_date = budget
+            self.conn.execute('UPDATE budgets SET name = ?, amount = ?, category = ? WHERE id = ?', (name, amount, category, budget_id))
+            if category != old_category:
+                self.conn.execute('UPDATE budgets SET spent = ? WHERE id = ?', 
+                                  (self._budget_spent(account_id, category, start_date, end_date), budget_id))
+            self.audit.log("budget_edited", "budget", budget_id, {"name": name, "amount": amount, "category": category})
+
+    @queued_write
+    def delete_budget(self, budget_id):
+        with self.db.write():
+            self.conn.execute('DELETE FROM budgets WHERE id = ?', (budget_id,))
+            self.audit.log("budget_deleted", "budget", budget_id)
+
+    def _roll_budgets(self):
+        # الميزانيات الشهرية والأسبوعية التي انتهت فترتها تنتقل للفترة الحالية ويُحسب المنفق فيها مرة واحدة
+        today = datetime.now().date()
+        expired = self.db.reader().execute("SELECT id, account_id, category, period FROM budgets WHERE period != 'custom' AND end_date < ?", 
+                                           (today.strftime("%Y-%m-%d"),)).fetchall()
+        if not expired:
+            return
+        with self.db.write():
+            for budget_id, account_id, category, period in expired:
+                start_date, end_date = _budget_period(period, today)
+                self.conn.execute('UPDATE budgets SET start_date = ?, end_date = ?, spent = ? WHERE id = ?', 
+                                  (start_date, end_date, self._budget_spent(account_id, category, start_date, end_date), budget_id))
+
+    def get_budgets(self, account_id=None):
+        # كل الميزانيات مع نسبة الاستخدام في استعلام واحد
+        self._roll_budgets()
+        query = 'SELECT id, name, amount, spent, account_id, category, period, start_date, end_date, spent / amount FROM budgets'
+        params = []
+        if account_id:
+            query += ' WHERE account_id = ?'
+            params.append(account_id)
+        return self.db.reader().execute(query + ' ORDER BY id', params).fetchall()
+
+class ReportSnapshot(FinanceManager):
+    def __init__(self, fm, copy=False):
+        self.__dict__.update(fm.__dict__)
+        self.db = SnapshotReader(fm.db, copy=copy)
+        self.conn = self.db.conn
+        self.write_queue = None
+        if not self.db.current:
+            # اللقطة أقدم أو أحدث من ذاكرة القراءة المشتركة، فلها ذاكرتها الخاصة
+            self._cache = OrderedDict()
+            self._cache_lock = threading.Lock()
+
+    def _roll_snapshots(self):
+        # رُحلت قبل فتح اللقطة، وإن بدأ شهر جديد أثناءها فـ balances_as_of يكمل من المعاملات
+        pass
+
+    def _roll_budgets(self):
+        pass
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,278 @@
+import csv
+import hashlib
+import io
+import math
+import os
+import re
+import time
+from datetime import datetime
+from finance_manager import normalize_arabic
+
+# استيراد كشوف الحسابات البنكية (CSV و OFX و QIF): القراءة سطرًا بسطر والإدخال على دفعات، فالذاكرة لا تكبر مع حجم الملف.
+# ترقيم الحركات المتطابقة داخل الملف لكل دفعة فقط، والدفعة لا تنتهي إلا عند تغير التاريخ، فالحركات المتطابقة
+# (وهي بنفس التاريخ) في كشف مرتب زمنيًا تقع في نفس الدفعة
+IMPORT_FORMATS = ("csv", "ofx", "qif")
+IMPORT_BATCH_SIZE = 20000
+IMPORT_PREVIEW_ROWS = 20
+IMPORT_MAX_REJECTED = 100
+IMPORT_PAYMENT_METHOD = "تحويل بنكي"
+
+# أسماء الأعمدة المتوقعة في CSV لكل حقل، أولها يطابق أعمدة export_csv
+CSV_COLUMNS = {
+    "date": ["date", "التاريخ", "تاريخ", "transaction date", "posted date", "posting date", "value date"],
+    "amount": ["amount", "المبلغ", "مبلغ", "value"],
+    "type": ["type", "النوع", "نوع المعاملة"],
+    "debit": ["debit", "مدين", "withdrawal", "withdrawals", "سحب"],
+    "credit": ["credit", "دائن", "deposit", "deposits", "إيداع"],
+    "description": ["description", "الوصف", "details", "narrative", "memo", "البيان"],
+    "payment_method": ["payment_method", "طريقة الدفع"],
+    "category": ["category", "الفئة"],
+    "account": ["account", "الحساب"],
+}
+TYPE_VALUES = {"in": "IN", "credit": "IN", "cr": "IN", "deposit": "IN", "وارد": "IN", "دائن": "IN",
+               "out": "OUT", "debit": "OUT", "dr": "OUT", "withdrawal": "OUT", "منصرف": "OUT", "صادر": "OUT", "مدين": "OUT"}
+DATE_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%d/%m/%y", "%m/%d/%Y", "%d.%m.%Y"]
+QIF_DATE_FORMATS = ["%m/%d/%Y", "%m/%d/%y", "%d/%m/%Y", "%Y-%m-%d"]
+ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩٫٬", "0123456789.,")
+
+def detect_format(filename):
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if extension not in IMPORT_FORMATS:
+        raise ValueError(f"صيغة ملف غير مدعومة: {extension or filename}")
+    return extension
+
+def parse_amount(value):
+    # "1,234.50" و "(50.00)" و "-50" و "٥٠٫٢٥" ورموز العملة
+    text = (value or "").translate(ARABIC_DIGITS).strip()
+    try:
+        amount = float(text.replace(",", ""))
+        if math.isfinite(amount):
+            return amount
+    except ValueError:
+        pass
+    negative = text.startswith("(") and text.endswith(")") or text.startswith("-") or text.endswith("-")
+    text = re.sub(r"[^0-9.]", "", text.replace(",", ""))
+    if not text:
+        raise ValueError("المبلغ غير صالح")
+    amount = float(text)
+    return -amount if negative else amount
+
+def parse_date(value, formats=DATE_FORMATS):
+    text = (value or "").translate(ARABIC_DIGITS).strip().replace("'", "/")
+    for date_format in formats:
+        try:
+            return datetime.strptime(text, date_format).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise ValueError(f"تاريخ غير صالح: {value}")
+
+def _date_parser(formats):
+    # الكشف فيه تواريخ قليلة متكررة، فكل نص تاريخ يُحلل مرة واحدة
+    cache = {}
+    def parse(value):
+        if value not in cache:
+            cache[value] = parse_date(value, formats)
+        return cache[value]
+    return parse
+
+def _text_stream(file):
+    # file ملف ثنائي (مثل ما يرفعه st.file_uploader)
+    return io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+
+def _csv_columns(header, mapping):
+    lowered = {name.strip().lower(): index for index, name in enumerate(header)}
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        names = [mapping[field]] if mapping and field in mapping else aliases
+        for name in names:
+            if name.strip().lower() in lowered:
+                columns[field] = lowered[name.strip().lower()]
+                break
+    if "date" not in columns or not ("amount" in columns or "debit" in columns or "credit" in columns):
+        raise ValueError("أعمدة التاريخ والمبلغ غير موجودة في الملف")
+    return columns
+
+def parse_csv(file, mapping=None, date_format=None):
+    # يعيد (رقم السطر، dict أو رسالة خطأ) لكل سطر. mapping: {"date": "اسم العمود", ...} لتجاوز الأسماء المتوقعة
+    reader = csv.reader(_text_stream(file))
+    header = next(reader, None)
+    if not header:
+        return
+    columns = _csv_columns(header, mapping)
+    to_date = _date_parser([date_format] if date_format else DATE_FORMATS)
+    # كل الحقول تُقرأ مرة واحدة لكل سطر، والحقل غير الموجود في الملف أو السطر القصير نص فارغ
+    fields = [(name, columns.get(name)) for name in CSV_COLUMNS]
+    for line, values in enumerate(reader, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        field = {name: values[index].strip() if index is not None and index < len(values) else "" for name, index in fields}
+        try:
+            if field["debit"] or field["credit"]:
+                amount = parse_amount(field["credit"] or "0") - parse_amount(field["debit"] or "0")
+            else:
+                amount = parse_amount(field["amount"])
+            trans_type = TYPE_VALUES.get(field["type"].lower())
+            if trans_type is None:
+                trans_type = "IN" if amount >= 0 else "OUT"
+            yield line, {"date": to_date(field["date"]), "amount": abs(amount), "trans_type": trans_type,
+                         "description": field["description"], "payment_method": field["payment_method"],
+                         "category": field["category"], "account": field["account"]}
+        except ValueError as e:
+            yield line, str(e)
+
+def _ofx_tags(stream, chunk_size=65536):
+    # OFX (SGML) قد لا يغلق الوسوم ولا يفصلها بأسطر: كل "<" يبدأ وسمًا جديدًا
+    buffer = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        parts = (buffer + chunk).split("<")
+        buffer = parts.pop()
+        for part in parts:
+            tag, _, value = part.partition(">")
+            yield tag.strip().upper(), value.strip()
+    tag, _, value = buffer.partition(">")
+    yield tag.strip().upper(), value.strip()
+
+def parse_ofx(file):
+    # رقم السطر هنا ترتيب الحركة في الملف. FITID يُستخدم في البصمة لأنه معرف البنك للحركة
+    number = 0
+    trans = None
+    to_date = _date_parser(["%Y%m%d"])
+    for tag, value in _ofx_tags(_text_stream(file)):
+        if tag == "STMTTRN":
+            trans = {}
+        elif tag == "/STMTTRN" and trans is not None:
+            number += 1
+            try:
+                amount = parse_amount(trans.get("TRNAMT"))
+                yield number, {"date": to_date(trans.get("DTPOSTED", "")[:8]), "amount": abs(amount),
+                               "trans_type": "IN" if amount >= 0 else "OUT",
+                               "description": " - ".join(part for part in (trans.get("NAME"), trans.get("MEMO")) if part),
+                               "external_id": trans.get("FITID")}
+            except ValueError as e:
+                yield number, str(e)
+            trans = None
+        elif trans is not None and tag and not tag.startswith("/"):
+            trans[tag] = value
+
+def parse_qif(file, date_format=None):
+    # كل حركة أسطر تبدأ بحرف الحقل وتنتهي بـ "^": D التاريخ، T المبلغ، P المستفيد، M ملاحظة، L الفئة
+    formats = [date_format] if date_format else QIF_DATE_FORMATS
+    trans, start = {}, None
+    for line, text in enumerate(_text_stream(file), start=1):
+        text = text.rstrip("\r\n")
+        if not text or text.startswith("!"):
+            continue
+        if text.startswith("^"):
+            if trans:
+                try:
+                    amount = parse_amount(trans.get("T") or trans.get("U"))
+                    yield start, {"date": parse_date((trans.get("D") or "").replace(" ", ""), formats), "amount": abs(amount), "trans_type": "IN" if amount >= 0 else "OUT",
+                                  "description": " - ".join(part for part in (trans.get("P"), trans.get("M")) if part),
+                                  "category": (trans.get("L") or "").strip("[]")}
+                except ValueError as e:
+                    yield start, str(e)
+            trans, start = {}, None
+            continue
+        start = start or line
+        trans.setdefault(text[0], text[1:].strip())
+
+PARSERS = {"csv": parse_csv, "ofx": parse_ofx, "qif": parse_qif}
+
+class CategoryRules:
+    # تصنيف تلقائي من custom_categories: أطول اسم فئة يظهر في الوصف (بعد توحيد الحروف العربية) لنفس الحساب ونوع المعاملة
+    def __init__(self, fm):
+        self.fm = fm
+        self._patterns = {}
+
+    def match(self, account_id, trans_type, description):
+        key = (account_id, trans_type)
+        if key not in self._patterns:
+            names = sorted((row[0] for row in self.fm.get_custom_categories(account_id, trans_type)), key=len, reverse=True)
+            normalized = {normalize_arabic(name).lower(): name for name in names if name.strip()}
+            self._patterns[key] = (re.compile("|".join(re.escape(name) for name in normalized)), normalized) if normalized else None
+        pattern = self._patterns[key]
+        if pattern:
+            found = pattern[0].search(normalize_arabic(description).lower())
+            if found:
+                return pattern[1][found.group(0)]
+        return None
+
+def fingerprint(account_id, trans, occurrence=0):
+    # البصمة لا تعتمد على السطر، فنفس الحركة من كشف آخر متداخل تُعد مكررة. الحركات المتطابقة في نفس الملف تُميز بترتيب تكرارها
+    if trans.get("external_id"):
+        key = f"{account_id}|fitid|{trans['external_id']}"
+    else:
+        key = (f"{account_id}|{trans['date'][:10]}|{trans['trans_type']}|{trans['amount']:.2f}|"
+               f"{' '.join(normalize_arabic(trans.get('description')).lower().split())}|{occurrence}")
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def import_statement(fm, file, account_id, fmt=None, filename=None, mapping=None, date_format=None, dry_run=False,
+                     batch_size=IMPORT_BATCH_SIZE):
+    # يعيد تقرير الملف: عدد الأسطر والمضاف والمكرر والمرفوض مع أسبابها، ومعاينة أول الحركات عند dry_run
+    # كل دفعة معاملة مستقلة؛ إذا فشلت دفعة (مثلًا الرصيد غير كافٍ) يتوقف الاستيراد وتبقى الدفعات السابقة
+    if isinstance(file, str):
+        with open(file, "rb") as opened:
+            return import_statement(fm, opened, account_id, fmt, filename or file, mapping, date_format, dry_run, batch_size)
+    filename = filename or getattr(file, "name", "")
+    fmt = fmt or detect_format(filename)
+    if fmt not in PARSERS:
+        raise ValueError(f"صيغة ملف غير مدعومة: {fmt}")
+    options = {"mapping": mapping} if fmt == "csv" else {}
+    if date_format and fmt != "ofx":
+        options["date_format"] = date_format
+    started = time.perf_counter()
+    accounts = {name: acc_id for acc_id, name in fm.get_page_context()["account_options"].items()}
+    rules = CategoryRules(fm)
+    report = {"file": filename, "format": fmt, "dry_run": dry_run, "rows": 0, "imported": 0, "duplicates": 0,
+              "rejected": 0, "rejected_rows": [], "preview": [], "error": None}
+    occurrences = {}
+    batch = []
+
+    def flush():
+        if dry_run:
+            existing = fm.existing_fingerprints(trans["fingerprint"] for trans in batch)
+            new_rows = [trans for trans in batch if trans["fingerprint"] not in existing]
+            report["imported"] += len(new_rows)
+            report["duplicates"] += len(batch) - len(new_rows)
+            report["preview"].extend(new_rows[:IMPORT_PREVIEW_ROWS - len(report["preview"])])
+        else:
+            imported, duplicates, _ = fm.import_transactions_batch(batch)
+            report["imported"] += imported
+            report["duplicates"] += duplicates
+        batch.clear()
+        occurrences.clear()
+
+    try:
+        for line, trans in PARSERS[fmt](file, **options):
+            report["rows"] += 1
+            trans_account_id = account_id
+            if isinstance(trans, dict) and trans.get("account"):
+                trans_account_id = accounts.get(trans["account"])
+                if trans_account_id is None:
+                    trans = f"حساب غير معروف: {trans['account']}"
+            if isinstance(trans, dict) and not trans["amount"]:
+                trans = "المبلغ يجب أن يكون موجبًا"
+            if isinstance(trans, str):
+                report["rejected"] += 1
+                if len(report["rejected_rows"]) < IMPORT_MAX_REJECTED:
+                    report["rejected_rows"].append((line, trans))
+                continue
+            if len(batch) >= batch_size and trans["date"][:10] != batch[-1]["date"][:10]:
+                flush()
+            base = fingerprint(trans_account_id, trans)
+            occurrences[base] = occurrences.get(base, -1) + 1
+            batch.append({"account_id": trans_account_id, "date": trans["date"], "amount": trans["amount"], "trans_type": trans["trans_type"],
+                          "description": trans.get("description") or "", "payment_method": trans.get("payment_method") or IMPORT_PAYMENT_METHOD,
+                          "category": rules.match(trans_account_id, trans["trans_type"], trans.get("description")) or trans.get("category") or "",
+                          "fingerprint": base if trans.get("external_id") or not occurrences[base] else fingerprint(trans_account_id, trans, occurrences[base])})
+        if batch:
+            flush()
+    except ValueError as e:
+        report["error"] = str(e)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    if not dry_run:
+        fm.audit.log("statement_imported", "account", account_id, {name: value for name, value in report.items() if name != "preview"})
+    return report
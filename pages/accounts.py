@@ -1,46 +1,16 @@
 import streamlit as st
 import pandas as pd
-from finance_manager import FinanceManager
-from styles import apply_sidebar_styles
+from bootstrap import bootstrap_page
+from diagnostics import PageTimer
 
 st.set_page_config(page_title="FloosAfandy - معاملاتي", layout="centered", initial_sidebar_state="collapsed")
 
-# Apply sidebar styles
-apply_sidebar_styles()
+page_timer = PageTimer("accounts")
 
 # Sidebar
-with st.sidebar:
-    st.image("https://via.placeholder.com/50.png", width=50)
-    st.markdown("<h2>💰 FloosAfandy</h2>", unsafe_allow_html=True)
-    fm = FinanceManager()
-    alerts = fm.check_alerts()
-    if alerts:
-        st.markdown(f"<p style='text-align: center; color: #f1c40f;'>⚠️ {len(alerts)} تنبيهات</p>", unsafe_allow_html=True)
-    st.markdown("<hr>", unsafe_allow_html=True)
+fm, context = bootstrap_page()
 
-    st.markdown("<div class='section-title'>الصفحات</div>", unsafe_allow_html=True)
-    if st.button("💸 معاملاتي", key="nav_transactions"):
-        st.switch_page("pages/transactions.py")
-    if st.button("🏦 حساباتي", key="nav_accounts"):
-        st.switch_page("pages/accounts.py")
-    if st.button("📊 تقاريري", key="nav_reports"):
-        st.switch_page("pages/reports.py")
-    st.button("📈 لوحة التحكم", key="nav_dashboard", disabled=True)
-
-    st.markdown("<hr>", unsafe_allow_html=True)
-    st.markdown("<div class='section-title'>الإعدادات</div>", unsafe_allow_html=True)
-    with st.expander("⚙️ الفلاتر", expanded=False):
-        accounts = fm.get_all_accounts()
-        account_options = {acc[0]: acc[1] for acc in accounts}
-        options_list = ["جميع الحسابات"] + list(account_options.keys())
-        time_range = st.selectbox("⏳ الفترة", ["الكل", "آخر 7 أيام", "آخر 30 يومًا", "آخر 90 يومًا"], key="time_range")
-        selected_account = st.selectbox("🏦 الحساب", options=options_list, 
-                                        format_func=lambda x: "جميع الحسابات" if x == "جميع الحسابات" else account_options[x], 
-                                        key="selected_account")
-        if st.button("🔄 إعادة تعيين", key="reset_filters"):
-            st.session_state.time_range = "الكل"
-            st.session_state.selected_account = "جميع الحسابات"
-            st.rerun()
+page_timer.lap("sidebar")
 
 # Main content (باقي الكود كما هو)
 
@@ -49,8 +19,8 @@ st.title("🏦 حساباتي")
 st.markdown("<p style='color: #6b7280;'>تابع وأدر حساباتك المالية بسهولة</p>", unsafe_allow_html=True)
 st.markdown("---")
 
-fm = FinanceManager()
-accounts = fm.get_all_accounts()
+accounts = context["accounts"]
+page_timer.lap("data")
 
 # Mobile-friendly CSS
 st.markdown("""
@@ -100,8 +70,7 @@ if filtered_accounts:
                     st.session_state[f"edit_{acc[0]}"] = True
             with col3:
                 if st.button("🗑️ حذف", key=f"del_{acc[0]}"):
-                    fm.conn.execute("DELETE FROM accounts WHERE id = ?", (acc[0],))
-                    fm.conn.commit()
+                    fm.delete_account(acc[0])
                     st.success("🗑️ تم الحذف!")
                     st.rerun()
             if st.session_state.get(f"edit_{acc[0]}", False):
@@ -110,11 +79,34 @@ if filtered_accounts:
                     new_balance = st.number_input("الرصيد", value=float(acc[2]), key=f"edit_balance_{acc[0]}")
                     new_min = st.number_input("الحد الأدنى", value=float(acc[3]), key=f"edit_min_{acc[0]}")
                     if st.form_submit_button("💾 حفظ التعديل"):
-                        fm.conn.execute("UPDATE accounts SET name = ?, balance = ?, min_balance = ? WHERE id = ?", 
-                                        (new_name, new_balance, new_min, acc[0]))
-                        fm.conn.commit()
+                        fm.edit_account(acc[0], new_name, new_balance, new_min)
                         st.success("✅ تم التعديل!")
                         st.session_state[f"edit_{acc[0]}"] = False
                         st.rerun()
 else:
     st.info("ℹ️ لا توجد حسابات تطابق البحث.")
+
+# Reconciliation
+with st.expander("🔍 مطابقة الأرصدة مع المعاملات", expanded=False):
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🔍 فحص", key="reconcile_check", use_container_width=True):
+            st.session_state["reconcile_result"] = fm.reconcile()
+    with col2:
+        if st.button("🛠️ تصحيح الأرصدة", key="reconcile_repair", use_container_width=True):
+            st.session_state["reconcile_result"] = fm.reconcile(repair=True)
+    result = st.session_state.get("reconcile_result")
+    if result:
+        if not result["discrepancies"]:
+            st.success(f"✅ كل الأرصدة مطابقة ({result['accounts']} حساب، {result['scanned']} معاملة جديدة)")
+        else:
+            discrepancy_df = pd.DataFrame(result["discrepancies"])[["name", "cached", "expected", "difference"]]
+            discrepancy_df.columns = ["الحساب", "الرصيد المسجل", "الرصيد الصحيح", "الفرق"]
+            st.dataframe(discrepancy_df, use_container_width=True, hide_index=True)
+            if result["repaired"]:
+                st.success("🛠️ تم تصحيح الأرصدة!")
+            else:
+                st.warning(f"⚠️ {len(result['discrepancies'])} حسابات رصيدها لا يطابق المعاملات")
+
+page_timer.lap("render")
+page_timer.done()
@@ -1,9 +1,13 @@
 import streamlit as st
-from finance_manager import FinanceManager
+import pandas as pd
+from resources import get_finance_manager
+from diagnostics import PageTimer
+
+page_timer = PageTimer("budgets")
 
 st.title("💼 إدارة الميزانيات")
 
-fm = FinanceManager()
+fm = get_finance_manager()
 
 # إضافة ميزانية جديدة
 st.subheader("إضافة ميزانية جديدة")
@@ -16,19 +20,34 @@ budget_amount = st.number_input("المبلغ", min_value=0.01, step=0.01)
 categories = fm.get_custom_categories(budget_account_id, "OUT")
 category_options = [cat[0] for cat in categories] if categories else ["غير مصنف"]
 budget_category = st.selectbox("📂 اختر الفئة", options=category_options)
+period_options = {"monthly": "شهرية", "weekly": "أسبوعية", "custom": "مخصصة"}
+budget_period = st.selectbox("📅 الفترة", options=list(period_options.keys()), format_func=lambda x: period_options[x])
+budget_start, budget_end = None, None
+if budget_period == "custom":
+    budget_start = st.date_input("من")
+    budget_end = st.date_input("إلى")
 if st.button("إضافة الميزانية"):
-    fm.add_budget(budget_name, budget_amount, budget_account_id, budget_category)
-    st.success("تم إضافة الميزانية بنجاح!")
+    try:
+        fm.add_budget(budget_name, budget_amount, budget_account_id, budget_category, budget_period, budget_start, budget_end)
+        st.success("تم إضافة الميزانية بنجاح!")
+    except Exception as e:
+        st.error(f"❌ خطأ أثناء إضافة الميزانية: {str(e)}")
+
+page_timer.lap("forms")
 
 # عرض الميزانيات
 st.subheader("قائمة الميزانيات")
 budgets = fm.get_budgets()
+page_timer.lap("data")
 if budgets:
-    budget_df = pd.DataFrame(budgets, columns=["id", "name", "amount", "spent", "account_id", "category"])
+    budget_df = pd.DataFrame(budgets, columns=["id", "name", "amount", "spent", "account_id", "category", "period", "start_date", "end_date", "utilization"])
     budget_df["account"] = budget_df["account_id"].map(account_options)
+    page_timer.lap("dataframe")
     for idx, row in budget_df.iterrows():
         col1, col2, col3 = st.columns([5, 1, 1])
-        col1.write(f"{row['name']} - {row['account']} - الفئة: {row['category']} - منفق: {row['spent']:,.2f}/{row['amount']:,.2f}")
+        col1.write(f"{row['name']} - {row['account']} - الفئة: {row['category']} - منفق: {row['spent']:,.2f}/{row['amount']:,.2f} "
+                   f"({row['start_date']} → {row['end_date']})")
+        col1.progress(min(max(row['utilization'], 0.0), 1.0))
         if col2.button("✏️", key=f"edit_budget_{row['id']}"):
             st.session_state[f"edit_budget_{row['id']}"] = True
         if col3.button("🗑️", key=f"del_budget_{row['id']}"):
@@ -48,3 +67,6 @@ if budgets:
                     st.session_state[f"edit_budget_{row['id']}"] = False
 else:
     st.info("لا توجد ميزانيات بعد.")
+
+page_timer.lap("render")
+page_timer.done()
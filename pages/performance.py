@@ -0,0 +1,36 @@
+import streamlit as st
+import pandas as pd
+from diagnostics import TRACER, TRACE_ENV
+
+# صفحة تشخيص غير مرتبطة بأزرار التنقل، وتعمل فقط عند تشغيل التطبيق مع FLOOSAFANDY_TRACE=1
+st.set_page_config(page_title="FloosAfandy - تشخيص", layout="wide")
+st.title("🩺 تشخيص الأداء")
+
+if not TRACER.enabled:
+    st.info(f"التتبع غير مفعل. شغّل التطبيق مع {TRACE_ENV}=1 لتسجيل أزمنة الاستعلامات والصفحات.")
+    st.stop()
+
+st.caption(f"منذ: {TRACER.started_at}")
+col1, col2 = st.columns(2)
+with col1:
+    st.download_button("💾 تصدير JSON", TRACER.export_json(), "diagnostics.json", "application/json", use_container_width=True)
+with col2:
+    if st.button("🔄 تصفير الإحصاءات", use_container_width=True):
+        TRACER.reset()
+        st.rerun()
+
+st.subheader("⏱️ أقسام الصفحات")
+page_stats = TRACER.page_stats()
+if page_stats:
+    st.dataframe(pd.DataFrame(page_stats), use_container_width=True)
+else:
+    st.info("لا توجد قياسات بعد.")
+
+st.subheader("🗄️ الاستعلامات")
+query_stats = TRACER.query_stats()
+if query_stats:
+    query_df = pd.DataFrame(query_stats)
+    min_count = st.number_input("أقل عدد مرات تنفيذ", min_value=1, value=1)
+    st.dataframe(query_df[query_df["count"] >= min_count], use_container_width=True)
+else:
+    st.info("لا توجد قياسات بعد.")
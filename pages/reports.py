@@ -1,56 +1,30 @@
 import streamlit as st
 import pandas as pd
-from finance_manager import FinanceManager
-from styles import apply_sidebar_styles
+from resources import get_report_worker
+from bootstrap import bootstrap_page
+from diagnostics import PageTimer
+from chart_data import bar_data, FREQ_LABELS
 import plotly.express as px
+import os
+import tempfile
 
 st.set_page_config(page_title="FloosAfandy - معاملاتي", layout="centered", initial_sidebar_state="collapsed")
 
-# Apply sidebar styles
-apply_sidebar_styles()
+page_timer = PageTimer("reports")
 
 # Sidebar
-with st.sidebar:
-    st.image("https://via.placeholder.com/50.png", width=50)
-    st.markdown("<h2>💰 FloosAfandy</h2>", unsafe_allow_html=True)
-    fm = FinanceManager()
-    alerts = fm.check_alerts()
-    if alerts:
-        st.markdown(f"<p style='text-align: center; color: #f1c40f;'>⚠️ {len(alerts)} تنبيهات</p>", unsafe_allow_html=True)
-    st.markdown("<hr>", unsafe_allow_html=True)
+fm, context = bootstrap_page()
 
-    st.markdown("<div class='section-title'>الصفحات</div>", unsafe_allow_html=True)
-    if st.button("💸 معاملاتي", key="nav_transactions"):
-        st.switch_page("pages/transactions.py")
-    if st.button("🏦 حساباتي", key="nav_accounts"):
-        st.switch_page("pages/accounts.py")
-    if st.button("📊 تقاريري", key="nav_reports"):
-        st.switch_page("pages/reports.py")
-    st.button("📈 لوحة التحكم", key="nav_dashboard", disabled=True)
-
-    st.markdown("<hr>", unsafe_allow_html=True)
-    st.markdown("<div class='section-title'>الإعدادات</div>", unsafe_allow_html=True)
-    with st.expander("⚙️ الفلاتر", expanded=False):
-        accounts = fm.get_all_accounts()
-        account_options = {acc[0]: acc[1] for acc in accounts}
-        options_list = ["جميع الحسابات"] + list(account_options.keys())
-        time_range = st.selectbox("⏳ الفترة", ["الكل", "آخر 7 أيام", "آخر 30 يومًا", "آخر 90 يومًا"], key="time_range")
-        selected_account = st.selectbox("🏦 الحساب", options=options_list, 
-                                        format_func=lambda x: "جميع الحسابات" if x == "جميع الحسابات" else account_options[x], 
-                                        key="selected_account")
-        if st.button("🔄 إعادة تعيين", key="reset_filters"):
-            st.session_state.time_range = "الكل"
-            st.session_state.selected_account = "جميع الحسابات"
-            st.rerun()
+page_timer.lap("sidebar")
 
 # ... (باقي الكود دون تغيير)
 st.title("📊 تقاريري")
 st.markdown("<p style='color: #6b7280;'>رؤية واضحة لأدائك المالي</p>", unsafe_allow_html=True)
 st.markdown("---")
 
-fm = FinanceManager()
-accounts = fm.get_all_accounts()
-account_options = {acc[0]: acc[1] for acc in accounts}
+report_worker = get_report_worker()
+accounts = context["accounts"]
+account_options = context["account_options"]
 
 # Mobile-friendly CSS
 st.markdown("""
@@ -70,14 +44,14 @@ with st.container():
     account_id = st.selectbox("🏦 الحساب", ["جميع الحسابات"] + list(account_options.keys()), 
                               format_func=lambda x: "جميع الحسابات" if x == "جميع الحسابات" else account_options[x])
     trans_type = st.selectbox("📋 النوع", ["الكل", "وارد", "منصرف"])
-    category = st.selectbox("📂 الفئة", ["الكل"] + [cat[0] for cat in fm.get_custom_categories(account_id, "IN" if trans_type == "وارد" else "OUT")] if trans_type != "الكل" and account_id != "جميع الحسابات" else ["الكل"])
+    category = st.selectbox("📂 الفئة", ["الكل"] + context["categories"].get((account_id, "IN" if trans_type == "وارد" else "OUT"), []) if trans_type != "الكل" and account_id != "جميع الحسابات" else ["الكل"])
     start_date = st.date_input("📅 من", value=None)
     end_date = st.date_input("📅 إلى", value=None)
     st.markdown("</div>", unsafe_allow_html=True)
 
 start_date_str = start_date.strftime("%Y-%m-%d %H:%M:%S") if start_date else None
 end_date_str = end_date.strftime("%Y-%m-%d %H:%M:%S") if end_date else None
-transactions = fm.filter_transactions(
+filters = dict(
     account_id=account_id if account_id != "جميع الحسابات" else None,
     start_date=start_date_str,
     end_date=end_date_str,
@@ -85,31 +59,78 @@ transactions = fm.filter_transactions(
     category=category if category != "الكل" else None
 )
 
-# Transactions Table
-st.subheader("📋 جدول المعاملات")
-if transactions:
-    df = pd.DataFrame(transactions, columns=["id", "date", "type", "amount", "account_id", "description", "payment_method", "category"])
-    df["type"] = df["type"].replace({"IN": "وارد", "OUT": "منصرف"})
-    df["account"] = df["account_id"].map(account_options)
-    st.dataframe(df[["date", "type", "amount", "account", "description", "payment_method", "category"]], height=200)
-    col1, col2 = st.columns(2)
-    with col1:
-        csv = df.to_csv(index=False).encode('utf-8')
-        st.download_button("💾 تحميل CSV", csv, "report.csv", "text/csv", use_container_width=True)
-    with col2:
-        st.button("📑 تصدير PDF", disabled=True, help="قيد التطوير", use_container_width=True)
-else:
-    st.info("ℹ️ لا توجد معاملات تطابق الفلاتر.")
+def export_download_button(label, export, file_name, mime, filters):
+    # Streamlit يستدعي build عند الضغط على الزر فقط، فلا يُمسح الدفتر مع كل إعادة تشغيل للصفحة.
+    # يُستدعى بعد انتهاء الصفحة، فالتصدير من المدير نفسه لا من اللقطة، ويُكتب في ملف مؤقت على دفعات
+    def build():
+        with tempfile.TemporaryDirectory() as export_dir:
+            path = os.path.join(export_dir, file_name)
+            with open(path, "wb") as export_file:
+                export(export_file, **filters)
+            with open(path, "rb") as export_file:
+                return export_file.read()
+    st.download_button(label, build, file_name, mime, use_container_width=True)
+
+# قراءات الصفحة كلها من لقطة واحدة لا تزاحم إدخال المعاملات، فالجدول والرسوم متطابقة
+# with يغلقها حتى مع st.rerun() أو خطأ أثناء الصفحة
+with fm.snapshot() as report_fm:
+    transactions = report_fm.filter_transactions(**filters)
+    page_timer.lap("data")
+
+    # Transactions Table
+    st.subheader("📋 جدول المعاملات")
+    if transactions:
+        df = pd.DataFrame(transactions, columns=["id", "date", "type", "amount", "account_id", "description", "payment_method", "category"])
+        df["type"] = df["type"].replace({"IN": "وارد", "OUT": "منصرف"})
+        df["account"] = df["account_id"].map(account_options)
+        page_timer.lap("dataframe")
+        st.dataframe(df[["date", "type", "amount", "account", "description", "payment_method", "category"]], height=200)
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            export_download_button("💾 تحميل CSV", fm.export_csv, "report.csv", "text/csv", filters)
+        with col2:
+            export_download_button("🗃️ تحميل Parquet", fm.export_parquet, "report.parquet", "application/octet-stream", filters)
+        with col3:
+            if st.button("📑 تصدير PDF", use_container_width=True):
+                st.session_state.report_job_id = report_worker.submit("pdf", **filters)
+        with col4:
+            if st.button("🌐 تصدير HTML", use_container_width=True):
+                st.session_state.report_job_id = report_worker.submit("html", **filters)
+        if st.session_state.get("report_job_id"):
+            job = report_worker.get_job(st.session_state.report_job_id)
+            job_format, job_status, job_artifact, job_error = job[2], job[4], job[5], job[6]
+            if job_status == "done":
+                with open(job_artifact, "rb") as report_file:
+                    st.download_button(f"📥 تحميل التقرير ({job_format.upper()})", report_file, f"report.{job_format}", 
+                                       "application/pdf" if job_format == "pdf" else "text/html", use_container_width=True)
+            elif job_status == "failed":
+                st.error(f"❌ فشل إنشاء التقرير: {job_error}")
+            else:
+                st.info("⏳ جاري إنشاء التقرير...")
+                if st.button("🔄 تحديث الحالة", use_container_width=True):
+                    st.rerun()
+    else:
+        st.info("ℹ️ لا توجد معاملات تطابق الفلاتر.")
+
+    page_timer.lap("table")
+
+    # Charts
+    st.subheader("📈 تحليل بياني")
+    if transactions:
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            freq, daily = bar_data(report_fm, **filters)
+            daily_df = pd.DataFrame(daily, columns=["date", "type", "amount"])
+            daily_df["type"] = daily_df["type"].replace({"IN": "وارد", "OUT": "منصرف"})
+            page_timer.lap("dataframe")
+            fig = px.bar(daily_df, x="date", y="amount", color="type", title="المعاملات بمرور الوقت", labels={"date": FREQ_LABELS[freq]}, color_discrete_map={"وارد": "#34d399", "منصرف": "#f87171"}, height=300)
+            st.plotly_chart(fig, use_container_width=True)
+            page_timer.lap("chart")
+        with col2:
+            category_summary = pd.DataFrame(report_fm.category_totals(**filters), columns=["category", "amount"])
+            page_timer.lap("dataframe")
+            fig_pie = px.pie(category_summary, values="amount", names="category", title="توزيع حسب الفئات", color_discrete_sequence=px.colors.qualitative.Bold, height=300)
+            st.plotly_chart(fig_pie, use_container_width=True)
+            page_timer.lap("chart")
 
-# Charts
-st.subheader("📈 تحليل بياني")
-if transactions:
-    col1, col2 = st.columns([1, 1])
-    with col1:
-        fig = px.bar(df, x="date", y="amount", color="type", title="المعاملات بمرور الوقت", color_discrete_map={"وارد": "#34d399", "منصرف": "#f87171"}, height=300)
-        st.plotly_chart(fig, use_container_width=True)
-    with col2:
-        df_expanded = df.assign(category=df["category"].str.split(", ")).explode("category")
-        category_summary = df_expanded.groupby("category")["amount"].sum().reset_index()
-        fig_pie = px.pie(category_summary, values="amount", names="category", title="توزيع حسب الفئات", color_discrete_sequence=px.colors.qualitative.Bold, height=300)
-        st.plotly_chart(fig_pie, use_container_width=True)
+page_timer.done()
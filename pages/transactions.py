@@ -1,54 +1,26 @@
+import io
 import streamlit as st
 import pandas as pd
-from finance_manager import FinanceManager
-from styles import apply_sidebar_styles
+from bootstrap import bootstrap_page
+from diagnostics import PageTimer
+from importers import IMPORT_FORMATS, import_statement
 
 st.set_page_config(page_title="FloosAfandy - معاملاتي", layout="centered", initial_sidebar_state="collapsed")
 
-# Apply sidebar styles
-apply_sidebar_styles()
+page_timer = PageTimer("transactions")
 
 # Sidebar
-with st.sidebar:
-    st.image("https://via.placeholder.com/50.png", width=50)
-    st.markdown("<h2>💰 FloosAfandy</h2>", unsafe_allow_html=True)
-    fm = FinanceManager()
-    alerts = fm.check_alerts()
-    if alerts:
-        st.markdown(f"<p style='text-align: center; color: #f1c40f;'>⚠️ {len(alerts)} تنبيهات</p>", unsafe_allow_html=True)
-    st.markdown("<hr>", unsafe_allow_html=True)
-
-    st.markdown("<div class='section-title'>الصفحات</div>", unsafe_allow_html=True)
-    if st.button("💸 معاملاتي", key="nav_transactions"):
-        st.switch_page("pages/transactions.py")
-    if st.button("🏦 حساباتي", key="nav_accounts"):
-        st.switch_page("pages/accounts.py")
-    if st.button("📊 تقاريري", key="nav_reports"):
-        st.switch_page("pages/reports.py")
-    st.button("📈 لوحة التحكم", key="nav_dashboard", disabled=True)
-
-    st.markdown("<hr>", unsafe_allow_html=True)
-    st.markdown("<div class='section-title'>الإعدادات</div>", unsafe_allow_html=True)
-    with st.expander("⚙️ الفلاتر", expanded=False):
-        accounts = fm.get_all_accounts()
-        account_options = {acc[0]: acc[1] for acc in accounts}
-        options_list = ["جميع الحسابات"] + list(account_options.keys())
-        time_range = st.selectbox("⏳ الفترة", ["الكل", "آخر 7 أيام", "آخر 30 يومًا", "آخر 90 يومًا"], key="time_range")
-        selected_account = st.selectbox("🏦 الحساب", options=options_list, 
-                                        format_func=lambda x: "جميع الحسابات" if x == "جميع الحسابات" else account_options[x], 
-                                        key="selected_account")
-        if st.button("🔄 إعادة تعيين", key="reset_filters"):
-            st.session_state.time_range = "الكل"
-            st.session_state.selected_account = "جميع الحسابات"
-            st.rerun()
+fm, context = bootstrap_page()
+
+page_timer.lap("sidebar")
 
 # Main content
 st.title("💸 معاملاتي")
 st.markdown("<p style='color: #6b7280;'>سجل وتحكم في كل حركة مالية</p>", unsafe_allow_html=True)
 st.markdown("---")
 
-accounts = fm.get_all_accounts()
-account_options = {acc[0]: acc[1] for acc in accounts}
+accounts = context["accounts"]
+account_options = context["account_options"]
 
 st.markdown("""
     <style>
@@ -84,11 +56,10 @@ with st.container():
         else:
             st.warning("⚠️ يرجى إدخال اسم للفئة!")
     
-    categories = fm.get_custom_categories(cat_account_id, cat_trans_type_db)
+    categories = context["categories"].get((cat_account_id, cat_trans_type_db), [])
     if categories:
         st.write("الفئات الحالية:")
-        for cat in categories:
-            cat_name = cat[0]
+        for cat_name in categories:
             col1, col2 = st.columns([3, 1])
             col1.write(f"{'📥' if cat_trans_type_db == 'IN' else '📤'} {cat_name}")
             if col2.button("🗑️", key=f"del_cat_{cat_name}_{cat_account_id}_{cat_trans_type_db}"):
@@ -115,8 +86,7 @@ trans_type = st.selectbox("📋 نوع المعاملة", ["وارد", "منصر
                           on_change=lambda: st.session_state.update({"trans_type": st.session_state.pre_add_type}))
 trans_type_db = "IN" if trans_type == "وارد" else "OUT"
 
-categories = fm.get_custom_categories(st.session_state.account_id, trans_type_db)
-category_options = [cat[0] for cat in categories] if categories else ["غير مصنف"]
+category_options = context["categories"].get((st.session_state.account_id, trans_type_db), ["غير مصنف"])
 
 with st.form(key="add_transaction_form"):
     st.markdown("<div class='form-container'>", unsafe_allow_html=True)
@@ -153,17 +123,74 @@ if submit_button or submit_add_another:
     except Exception as e:
         st.error(f"❌ خطأ أثناء الحفظ: {str(e)}")
 
+st.subheader("📥 استيراد كشف حساب")
+with st.expander("📄 ملف CSV أو OFX أو QIF من البنك", expanded=False):
+    import_account = st.selectbox("🏦 الحساب", options=list(account_options.keys()), 
+                                  format_func=lambda x: account_options[x], key="import_account")
+    statement = st.file_uploader("📄 ملف الكشف", type=list(IMPORT_FORMATS), key="import_file")
+    date_formats = {"تلقائي": None, "يوم/شهر/سنة": "%d/%m/%Y", "شهر/يوم/سنة": "%m/%d/%Y", "سنة-شهر-يوم": "%Y-%m-%d"}
+    import_date_format = st.selectbox("📅 صيغة التاريخ", list(date_formats.keys()), key="import_date_format")
+    col_preview, col_import = st.columns(2)
+    with col_preview:
+        preview_button = st.button("👁️ معاينة", key="import_preview", use_container_width=True)
+    with col_import:
+        import_button = st.button("📥 استيراد", key="import_run", type="primary", use_container_width=True)
+    if statement and (preview_button or import_button):
+        try:
+            st.session_state["import_report"] = import_statement(fm, io.BytesIO(statement.getvalue()), import_account, filename=statement.name,
+                                                                 date_format=date_formats[import_date_format], dry_run=preview_button)
+        except Exception as e:
+            st.error(f"❌ خطأ أثناء الاستيراد: {str(e)}")
+    report = st.session_state.get("import_report")
+    if report:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("سيُضاف" if report["dry_run"] else "تمت إضافته", report["imported"])
+        col2.metric("مكرر", report["duplicates"])
+        col3.metric("مرفوض", report["rejected"])
+        if report["error"]:
+            st.error(f"❌ توقف الاستيراد: {report['error']}")
+        elif not report["dry_run"]:
+            st.success(f"✅ تم استيراد {report['file']} في {report['seconds']} ثانية")
+        if report["preview"]:
+            preview_df = pd.DataFrame(report["preview"])[["date", "trans_type", "amount", "description", "category"]]
+            preview_df.columns = ["التاريخ", "النوع", "المبلغ", "الوصف", "الفئة"]
+            preview_df["النوع"] = preview_df["النوع"].replace({"IN": "وارد", "OUT": "منصرف"})
+            st.dataframe(preview_df, use_container_width=True, hide_index=True)
+        if report["rejected_rows"]:
+            st.dataframe(pd.DataFrame(report["rejected_rows"], columns=["السطر", "السبب"]), use_container_width=True, hide_index=True)
+
+page_timer.lap("forms")
+
 st.subheader("📋 المعاملات")
 search_query = st.text_input("🔍 تصفية المعاملات", "")
-transactions = fm.get_all_transactions()
+PAGE_SIZE = 50
+if "trans_page_keys" not in st.session_state:
+    st.session_state.trans_page_keys = [None]
+if search_query:
+    transactions = fm.search_transactions(search_query, limit=PAGE_SIZE)
+    has_next = False
+else:
+    transactions = fm.filter_transactions_page(limit=PAGE_SIZE + 1, after=st.session_state.trans_page_keys[-1])
+    has_next = len(transactions) > PAGE_SIZE
+    transactions = transactions[:PAGE_SIZE]
+page_timer.lap("data")
 if transactions:
     df = pd.DataFrame(transactions, columns=["id", "date", "type", "amount", "account_id", "description", "payment_method", "category"])
     df["account"] = df["account_id"].map(account_options)
     df["type"] = df["type"].replace({"IN": "وارد", "OUT": "منصرف"})
-    filtered_df = df[df.apply(lambda row: search_query.lower() in str(row).lower(), axis=1)] if search_query else df
-    for i, row in filtered_df.iterrows():
+    page_timer.lap("dataframe")
+    for i, row in df.iterrows():
         st.markdown(f"<div class='transaction-card'>{'📥' if row['type'] == 'وارد' else '📤'} {row['date']} - {row['amount']:,.2f} - {row['account']} - {row['category']}</div>", 
                     unsafe_allow_html=True)
+    col_prev, col_next = st.columns(2)
+    with col_prev:
+        if st.button("⬅️ السابق", disabled=len(st.session_state.trans_page_keys) == 1 or bool(search_query), use_container_width=True):
+            st.session_state.trans_page_keys.pop()
+            st.rerun()
+    with col_next:
+        if st.button("التالي ➡️", disabled=not has_next, use_container_width=True):
+            st.session_state.trans_page_keys.append((transactions[-1][1], transactions[-1][0]))
+            st.rerun()
 else:
     st.info("ℹ️ لا توجد معاملات.")
 
@@ -179,8 +206,7 @@ if transactions:
         edit_type = st.selectbox("📋 النوع", ["وارد", "منصرف"], 
                                  index=0 if selected_trans["type"] == "وارد" else 1, key="edit_type")
         edit_type_db = "IN" if edit_type == "وارد" else "OUT"
-        edit_categories = fm.get_custom_categories(edit_account, edit_type_db)
-        edit_category_options = [cat[0] for cat in edit_categories] if edit_categories else ["غير مصنف"]
+        edit_category_options = context["categories"].get((edit_account, edit_type_db), ["غير مصنف"])
         edit_selected_category = st.selectbox("📂 الفئة", options=edit_category_options, 
                                               index=edit_category_options.index(selected_trans["category"]) if selected_trans["category"] in edit_category_options else 0, 
                                               key="edit_category")
@@ -209,14 +235,11 @@ if transactions:
 
     if delete_button:
         try:
-            with fm.conn:
-                old_trans = fm.conn.execute('SELECT type, amount, account_id FROM transactions WHERE id = ?', (trans_id,)).fetchone()
-                old_type, old_amount, old_account_id = old_trans
-                fm.conn.execute('UPDATE accounts SET balance = balance + ? WHERE id = ?', 
-                                (old_amount if old_type == "IN" else -old_amount, old_account_id))
-                fm.conn.execute("DELETE FROM transactions WHERE id = ?", (trans_id,))
-                fm.conn.commit()
+            fm.delete_transaction(trans_id)
             st.success("🗑️ تم الحذف!")
             st.rerun()
         except Exception as e:
             st.error(f"❌ خطأ أثناء الحذف: {str(e)}")
+
+page_timer.lap("render")
+page_timer.done()
@@ -0,0 +1,22 @@
+import argparse
+import json
+import sys
+from finance_manager import FinanceManager
+
+# تشغيل المطابقة من سطر الأوامر (مثلًا ليلًا من cron): يخرج بالرمز 1 إذا وُجدت فروق ولم تُصحح
+# ذاكرة القراءة المؤقتة في التطبيق الشغال لا ترى تصحيحات --repair من هذه العملية حتى أول كتابة فيه أو إعادة تشغيله
+def main():
+    parser = argparse.ArgumentParser(description="مطابقة أرصدة الحسابات مع دفتر المعاملات")
+    parser.add_argument("--db", default="finance.db")
+    parser.add_argument("--repair", action="store_true", help="تصحيح الأرصدة المختلفة")
+    parser.add_argument("--full", action="store_true", help="إعادة الحساب من أول معاملة بدل آخر نقطة مطابقة")
+    args = parser.parse_args()
+    fm = FinanceManager(args.db)
+    result = fm.reconcile(repair=args.repair, full=args.full)
+    fm.audit.flush()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if result["discrepancies"] and not result["repaired"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
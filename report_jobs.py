@@ -0,0 +1,164 @@
+import copy
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from finance_manager import FinanceManager
+
+REPORT_DIR = "reports"
+# أول خط موجود يدعم العربية يُستخدم في ملفات PDF
+REPORT_FONTS = ["fonts/NotoNaskhArabic-Regular.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"]
+TYPE_LABELS = {"IN": "وارد", "OUT": "منصرف"}
+TYPE_COLORS = {"IN": (52, 211, 153), "OUT": (248, 113, 113)}
+
+class ReportWorker:
+    # المهام تُسجل في جدول report_jobs وتُنفذ في عمليات منفصلة، والتقارير المتطابقة تُعاد من الملفات الجاهزة
+    def __init__(self, fm, report_dir=REPORT_DIR, max_workers=2):
+        self.fm = fm
+        self.report_dir = report_dir
+        self.executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        self.futures = {}
+
+    def submit(self, report_format, **filters):
+        if report_format not in RENDERERS:
+            raise ValueError(f"صيغة غير مدعومة: {report_format}")
+        cache_key = hashlib.sha256(json.dumps({"db": os.path.abspath(self.fm.db_file), "format": report_format, "filters": filters, "revision": self.fm.get_revision()},
+                                              sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        job = self.fm.find_report_job(cache_key)
+        if job:
+            job_id, status, artifact = job[0], job[4], job[5]
+            if status == "done" and artifact and os.path.exists(artifact):
+                return job_id
+            if (self.fm.db_file, job_id) in self.futures and not self.futures[(self.fm.db_file, job_id)].done():
+                return job_id
+        job_id = self.fm.add_report_job(cache_key, report_format, json.dumps(filters, default=str))
+        self.futures[(self.fm.db_file, job_id)] = self.executor.submit(render_report, self.fm.db_file, job_id, self.report_dir)
+        return job_id
+
+    def for_manager(self, fm):
+        # نفس العمليات والمهام الجارية لقاعدة بيانات أخرى (مستأجر آخر)، والمهام مميزة بملف قاعدة البيانات
+        worker = copy.copy(self)
+        worker.fm = fm
+        return worker
+
+    def get_job(self, job_id):
+        return self.fm.get_report_job(job_id)
+
+def render_report(db_file, job_id, report_dir=REPORT_DIR):
+    fm = FinanceManager(db_file)
+    try:
+        _, cache_key, report_format, filters = fm.get_report_job(job_id)[:4]
+        fm.update_report_job(job_id, "running")
+        os.makedirs(report_dir, exist_ok=True)
+        path = os.path.join(report_dir, f"{cache_key}.{report_format}")
+        # كل أجزاء التقرير (الملخص والرسوم والجدول) من لقطة واحدة حتى لو أُضيفت معاملات أثناء الإنشاء
+        with fm.snapshot() as snapshot:
+            RENDERERS[report_format](snapshot, path + ".tmp", json.loads(filters))
+        os.replace(path + ".tmp", path)
+        fm.update_report_job(job_id, "done", artifact=path)
+    except Exception as e:
+        fm.update_report_job(job_id, "failed", error=str(e))
+    finally:
+        # العامل يعيش طويلًا، فاتصال الكتابة وخيط سجل التدقيق لكل مهمة يُغلقان بعدها
+        fm.close()
+
+def _report_data(fm, filters):
+    totals = dict(fm.summarize(group_by=["type"], **filters))
+    return {
+        "accounts": {acc[0]: acc[1] for acc in fm.get_all_accounts()},
+        "total_in": totals.get("IN", 0.0),
+        "total_out": totals.get("OUT", 0.0),
+        "categories": fm.category_totals(**filters)[:10],
+        "monthly": [(f"{month} {TYPE_LABELS.get(trans_type, trans_type)}", amount, trans_type)
+                    for month, trans_type, amount in fm.summarize(group_by=["month", "type"], **filters)],
+    }
+
+def _svg_bars(items, width=520, bar_height=22):
+    # items: (label, value, type) والأعمدة تمتد من اليمين لليسار لتناسب الاتجاه العربي
+    top = max((value for _, value, _ in items), default=0) or 1
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{bar_height * len(items) + 4}">']
+    for i, (label, value, trans_type) in enumerate(items):
+        bar_width = (width - 180) * value / top
+        red, green, blue = TYPE_COLORS.get(trans_type, (107, 72, 255))
+        y = i * bar_height
+        parts.append(f'<text x="{width}" y="{y + 15}" text-anchor="end" font-size="12">{html.escape(str(label))}</text>'
+                     f'<rect x="{width - 130 - bar_width:.1f}" y="{y + 4}" width="{bar_width:.1f}" height="{bar_height - 8}" fill="rgb({red},{green},{blue})"/>'
+                     f'<text x="{width - 136 - bar_width:.1f}" y="{y + 15}" text-anchor="end" font-size="11">{value:,.2f}</text>')
+    parts.append('</svg>')
+    return "".join(parts)
+
+def render_html(fm, path, filters):
+    data = _report_data(fm, filters)
+    with open(path, "w", encoding="utf-8") as report:
+        report.write('<!DOCTYPE html><html lang="ar" dir="rtl"><head><meta charset="utf-8"><title>FloosAfandy - كشف حساب</title>'
+                     '<style>body{font-family:sans-serif;color:#1A2525;margin:24px;} table{border-collapse:collapse;width:100%;font-size:13px;}'
+                     'th,td{border:1px solid #e5e7eb;padding:4px 6px;text-align:right;} th{background:#40E0D0;}</style></head><body>')
+        report.write('<h1>💰 FloosAfandy - كشف حساب</h1>')
+        report.write(f'<p>الوارد: {data["total_in"]:,.2f} | الصادر: {data["total_out"]:,.2f} | الصافي: {data["total_in"] - data["total_out"]:,.2f}</p>')
+        report.write('<h2>توزيع حسب الفئات</h2>' + _svg_bars([(name, amount, None) for name, amount in data["categories"]]))
+        report.write('<h2>الحركة الشهرية</h2>' + _svg_bars(data["monthly"]))
+        report.write('<h2>المعاملات</h2><table><tr><th>التاريخ</th><th>النوع</th><th>المبلغ</th><th>الحساب</th>'
+                     '<th>الوصف</th><th>طريقة الدفع</th><th>الفئة</th></tr>')
+        for rows in fm.iter_transactions(**filters):
+            report.write("".join(
+                "<tr>" + "".join(f"<td>{html.escape(str(value or ''))}</td>" for value in (
+                    date, TYPE_LABELS.get(trans_type, trans_type), f"{amount:,.2f}", data["accounts"].get(account_id),
+                    description, payment_method, category)) + "</tr>"
+                for _, date, trans_type, amount, account_id, description, payment_method, category in rows))
+        report.write('</table></body></html>')
+
+def _find_report_font():
+    for font in REPORT_FONTS:
+        if os.path.exists(font):
+            return font
+    raise ValueError("لا يوجد خط يدعم العربية لإنشاء ملف PDF")
+
+def render_pdf(fm, path, filters):
+    from fpdf import FPDF
+    from fpdf.enums import XPos, YPos
+    data = _report_data(fm, filters)
+    pdf = FPDF()
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.add_font("Report", fname=_find_report_font())
+    pdf.set_text_shaping(use_shaping_engine=True, direction="rtl")
+    pdf.add_page()
+    pdf.set_font("Report", size=16)
+    pdf.cell(0, 10, "FloosAfandy - كشف حساب", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="R")
+    pdf.set_font("Report", size=11)
+    pdf.cell(0, 8, f"الوارد: {data['total_in']:,.2f} | الصادر: {data['total_out']:,.2f} | الصافي: {data['total_in'] - data['total_out']:,.2f}",
+             new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="R")
+
+    def bars(title, items):
+        pdf.set_font("Report", size=13)
+        pdf.cell(0, 9, title, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="R")
+        pdf.set_font("Report", size=9)
+        top = max((value for _, value, _ in items), default=0) or 1
+        for label, value, trans_type in items:
+            bar_width = (pdf.epw - 60) * value / top
+            pdf.set_fill_color(*TYPE_COLORS.get(trans_type, (107, 72, 255)))
+            pdf.rect(pdf.l_margin + pdf.epw - 45 - bar_width, pdf.get_y() + 1, bar_width, 4, style="F")
+            pdf.cell(0, 6, f"{label}  {value:,.2f}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="R")
+
+    bars("توزيع حسب الفئات", [(name, amount, None) for name, amount in data["categories"]])
+    bars("الحركة الشهرية", data["monthly"])
+
+    headers = ["التاريخ", "النوع", "المبلغ", "الحساب", "طريقة الدفع", "الفئة"]
+    widths = [38, 18, 26, 36, 30, 42]
+    pdf.add_page()
+    pdf.set_font("Report", size=9)
+    pdf.set_fill_color(64, 224, 208)
+    for header, width in reversed(list(zip(headers, widths))):
+        pdf.cell(width, 7, header, border=1, align="R", fill=True)
+    pdf.ln()
+    for rows in fm.iter_transactions(**filters):
+        for _, date, trans_type, amount, account_id, _, payment_method, category in rows:
+            values = [date, TYPE_LABELS.get(trans_type, trans_type), f"{amount:,.2f}", data["accounts"].get(account_id) or "",
+                      payment_method or "", category or ""]
+            for value, width in reversed(list(zip(values, widths))):
+                pdf.cell(width, 6, str(value), border=1, align="R")
+            pdf.ln()
+    pdf.output(path)
+
+RENDERERS = {"pdf": render_pdf, "html": render_html}
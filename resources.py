@@ -0,0 +1,43 @@
+import os
+import streamlit as st
+from finance_manager import FinanceManager
+from report_jobs import ReportWorker
+from tenants import TenantRouter
+
+# طابور الكتابة اختياري: FLOOSAFANDY_WRITE_QUEUE=1 عند تشغيل التطبيق يجمع كتابات كل الجلسات في خيط واحد بالتزام واحد لكل دفعة
+WRITE_QUEUE_ENV = "FLOOSAFANDY_WRITE_QUEUE"
+# تعدد المستأجرين اختياري: FLOOSAFANDY_TENANTS_DIR=tenants يجعل لكل مستأجر ملفًا في هذا المجلد، ويُختار بـ ?tenant=... في الرابط
+TENANTS_ENV = "FLOOSAFANDY_TENANTS_DIR"
+DEFAULT_TENANT = "default"
+
+@st.cache_resource
+def _shared_finance_manager(db_file="finance.db"):
+    # نسخة واحدة مشتركة بين كل الجلسات، اتصالات القراءة منفصلة لكل خيط والكتابة عبر اتصال واحد
+    return FinanceManager(db_file, write_queue=os.environ.get(WRITE_QUEUE_ENV) == "1")
+
+@st.cache_resource
+def get_tenant_router():
+    return TenantRouter(os.environ[TENANTS_ENV], write_queue=os.environ.get(WRITE_QUEUE_ENV) == "1")
+
+def current_tenant():
+    # المستأجر من الرابط ويبقى في الجلسة عند التنقل بين الصفحات
+    if "tenant" in st.query_params:
+        st.session_state["tenant"] = st.query_params["tenant"]
+    return st.session_state.get("tenant", DEFAULT_TENANT)
+
+def get_finance_manager(db_file="finance.db"):
+    if os.environ.get(TENANTS_ENV):
+        tenant = current_tenant()
+        try:
+            return get_tenant_router().get(tenant, create=tenant == DEFAULT_TENANT)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            st.stop()
+    return _shared_finance_manager(db_file)
+
+@st.cache_resource
+def _report_worker():
+    return ReportWorker(get_finance_manager())
+
+def get_report_worker():
+    return _report_worker().for_manager(get_finance_manager())
@@ -0,0 +1,131 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from finance_manager import FinanceManager
+
+# كل مستأجر (أسرة أو عميل) له ملف SQLite خاص في TENANTS_DIR، فلا تنتظر كتابات مستأجر كتابات غيره
+TENANTS_DIR = "tenants"
+TENANT_POOL_SIZE = 16
+# المستأجر المستخدم خلال آخر TENANT_IDLE_SECONDS لا يُغلق حتى لو تجاوز المجمع حجمه، لأن صفحة قد تكون تستخدمه الآن
+TENANT_IDLE_SECONDS = 60
+TENANT_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+class TenantRouter:
+    def __init__(self, base_dir=TENANTS_DIR, pool_size=TENANT_POOL_SIZE, idle_seconds=TENANT_IDLE_SECONDS, write_queue=False, max_workers=8):
+        self.base_dir = base_dir
+        self.pool_size = pool_size
+        self.idle_seconds = idle_seconds
+        self.write_queue = write_queue
+        self.max_workers = max_workers
+        self._pool = OrderedDict()
+        self._opening = {}
+        self._lock = threading.Lock()
+        os.makedirs(base_dir, exist_ok=True)
+
+    def db_path(self, tenant):
+        # الاسم يُستخدم كاسم ملف، فلا يُسمح إلا بحروف وأرقام لاتينية و _ و -
+        if not TENANT_NAME.match(tenant or ""):
+            raise ValueError(f"اسم مستأجر غير صالح: {tenant}")
+        return os.path.join(self.base_dir, f"{tenant}.db")
+
+    def tenants(self):
+        return sorted(name[:-3] for name in os.listdir(self.base_dir) if name.endswith(".db") and TENANT_NAME.match(name[:-3]))
+
+    def create_tenant(self, tenant):
+        if os.path.exists(self.db_path(tenant)):
+            raise ValueError(f"المستأجر موجود مسبقًا: {tenant}")
+        return self.get(tenant, create=True)
+
+    def get(self, tenant, create=False):
+        path = self.db_path(tenant)
+        with self._lock:
+            fm = self._pooled(tenant)
+            if fm:
+                return fm
+            opening = self._opening.setdefault(tenant, threading.Lock())
+        # الفتح (والترحيلات) خارج قفل المجمع حتى لا ينتظر باقي المستأجرين، وقفل لكل مستأجر
+        # حتى لا يفتح طلبان أولان لنفس المستأجر ملفه معًا وينتظر الثاني نسخة الأول
+        with opening:
+            try:
+                with self._lock:
+                    fm = self._pooled(tenant)
+                if fm:
+                    return fm
+                if not create and not os.path.exists(path):
+                    raise ValueError(f"المستأجر غير موجود: {tenant}")
+                fm = FinanceManager(path, write_queue=self.write_queue)
+                with self._lock:
+                    self._pool[tenant] = [fm, time.monotonic()]
+                    evicted = self._evict()
+            finally:
+                with self._lock:
+                    self._opening.pop(tenant, None)
+        for manager in evicted:
+            manager.close()
+        return fm
+
+    def _pooled(self, tenant):
+        # داخل القفل: المدير المفتوح للمستأجر مع تحديث وقت استخدامه، أو None
+        entry = self._pool.get(tenant)
+        if entry:
+            entry[1] = time.monotonic()
+            self._pool.move_to_end(tenant)
+            return entry[0]
+        return None
+
+    def _evict(self):
+        # داخل القفل: إخراج الأقدم استخدامًا من المستأجرين الخاملين حتى يعود المجمع لحجمه
+        now = time.monotonic()
+        evicted = []
+        for tenant, (fm, last_used) in list(self._pool.items()):
+            if len(self._pool) <= self.pool_size:
+                break
+            if now - last_used >= self.idle_seconds:
+                del self._pool[tenant]
+                evicted.append(fm)
+        return evicted
+
+    def close(self):
+        with self._lock:
+            managers = [entry[0] for entry in self._pool.values()]
+            self._pool.clear()
+        for fm in managers:
+            fm.close()
+
+    def _read_only(self, tenant):
+        return sqlite3.connect(Path(self.db_path(tenant)).absolute().as_uri() + "?mode=ro", uri=True)
+
+    def map_tenants(self, fn, tenants=None):
+        # fn(conn) لكل مستأجر بالتوازي: {tenant: النتيجة أو الاستثناء}، وخطأ مستأجر لا يوقف الباقين
+        # conn اتصال mode=ro مؤقت لا يمر بالمجمع، فلا ترحيلات ولا سجل تدقيق لكل مستأجر كما في فتح FinanceManager
+        def call(tenant):
+            try:
+                conn = self._read_only(tenant)
+            except Exception as e:
+                return e
+            try:
+                return fn(conn)
+            except Exception as e:
+                return e
+            finally:
+                conn.close()
+        tenants = self.tenants() if tenants is None else list(tenants)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(tenants, executor.map(call, tenants)))
+
+    def query_all(self, sql, params=(), tenants=None):
+        # استعلام قراءة على كل الملفات بالتوازي باتصالات mode=ro مؤقتة، والنتيجة صفوف (tenant, ...) مدمجة
+        def run(tenant):
+            conn = self._read_only(tenant)
+            try:
+                return [(tenant,) + tuple(row) for row in conn.execute(sql, params)]
+            finally:
+                conn.close()
+        tenants = self.tenants() if tenants is None else list(tenants)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return [row for rows in executor.map(run, tenants) for row in rows]